@@ -0,0 +1,132 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from core.config import ATR_INTERVAL
+
+os.makedirs("data", exist_ok=True)
+
+# Fixed-width candle record (80 bytes), appended as raw bytes and read back through np.memmap
+CANDLE_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("vwap", "<f8"),
+    ("volume", "<f8"),
+    ("count", "<i8"),
+    ("tr", "<f8"),
+    ("atr", "<f8"),
+])
+
+# Expired records are only reclaimed once they exceed this share of the file
+COMPACT_RATIO = 0.25
+
+class CandleStore:
+    def __init__(self, pair, interval=ATR_INTERVAL):
+        self.pair = pair
+        self.data_file = f"data/{pair}_candles_{interval}min.bin"
+        self.index_file = f"data/{pair}_candles_{interval}min.json"
+        self.legacy_file = f"data/{pair}_atr_data_{interval}min.csv"
+        self._start = self._load_index()
+
+    def exists(self):
+        return os.path.exists(self.data_file)
+
+    def _load_index(self):
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r") as f:
+                return int(json.load(f).get("start", 0))
+        return 0
+
+    def _save_index(self):
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"start": self._start}, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _count(self):
+        # Whole records only: readers in other processes may see an append in progress
+        if not self.exists():
+            return 0
+        return os.path.getsize(self.data_file) // CANDLE_DTYPE.itemsize
+
+    def _repair(self):
+        # Drop a record torn by a crash mid-append before writing after it
+        if not self.exists():
+            return
+        size = os.path.getsize(self.data_file)
+        if size % CANDLE_DTYPE.itemsize:
+            os.truncate(self.data_file, size - size % CANDLE_DTYPE.itemsize)
+
+    def read(self):
+        # Zero-copy view of the retained candles: columns are strided views such as candles["high"]
+        count = self._count()
+        if count <= self._start:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        candles = np.memmap(self.data_file, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+        return candles[self._start:]
+
+    def append(self, records):
+        if len(records) == 0:
+            return
+        self._repair()
+        with open(self.data_file, "ab") as f:
+            f.write(np.ascontiguousarray(records, dtype=CANDLE_DTYPE).tobytes())
+
+    def trim(self, cutoff_time):
+        # Retention is logical: move the start pointer past expired candles without touching the data
+        count = self._count()
+        if count == 0:
+            return
+        candles = np.memmap(self.data_file, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+        start = int(np.searchsorted(candles["time"], cutoff_time, side="left"))
+        del candles
+
+        if start == self._start:
+            return
+        self._start = start
+
+        if self._start > count * COMPACT_RATIO:
+            self._compact(count)
+        else:
+            self._save_index()
+
+    def _compact(self, count):
+        candles = np.memmap(self.data_file, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+        tmp_file = self.data_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(candles[self._start:].tobytes())
+        del candles
+        # Index first: a reader in between sees the old file from 0, which only adds expired candles
+        self._start = 0
+        self._save_index()
+        os.replace(tmp_file, self.data_file)
+
+    def import_legacy_csv(self):
+        # One-time migration from the per-pair ATR CSV written by previous versions
+        if self.exists() or not os.path.exists(self.legacy_file):
+            return False
+
+        df = pd.read_csv(self.legacy_file)
+        df.columns = [c.strip().lower() for c in df.columns]
+        # The last row may be a candle that was still open when it was written: it gets refetched
+        df = df.iloc[:-1]
+        records = np.zeros(len(df), dtype=CANDLE_DTYPE)
+        for name in CANDLE_DTYPE.names:
+            if name in df.columns:
+                records[name] = df[name].to_numpy()
+        # Exclusive create: the bot and the ATR-min worker may both try the migration
+        try:
+            with open(self.data_file, "xb") as f:
+                f.write(records.tobytes())
+        except FileExistsError:
+            return False
+        return True
+
+def to_dataframe(candles):
+    # Columns are the store's views, not copies (copy=False): read-only, as the memmap is opened "r"
+    df = pd.DataFrame({name: candles[name] for name in CANDLE_DTYPE.names}, copy=False)
+    df["dtime"] = pd.to_datetime(df["time"], unit="s")
+    return df
@@ -11,6 +11,8 @@ KRAKEN_API_SECRET = os.getenv("KRAKEN_API_SECRET")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 ALLOWED_USER_ID = os.getenv("ALLOWED_USER_ID")
 POLL_INTERVAL_SEC = int(os.getenv("POLL_INTERVAL_SEC", 20))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", 500))  # Pending notifications kept before dropping new ones
+NOTIFY_INTERVAL_SEC = float(os.getenv("NOTIFY_INTERVAL_SEC", 1))  # Minimum time between messages to the chat
 
 # Bot Settings
 MODE = os.getenv("MODE")  # Options: "onek", "dualk"
@@ -20,6 +22,17 @@ ATR_INTERVAL = int(os.getenv("ATR_INTERVAL", 15))  # ATR chart timeframe in minu
 ATR_PERIOD = int(os.getenv("ATR_PERIOD", 14))  # ATR calculation period in candles
 ATR_MIN_PERCENTILE = float(os.getenv("ATR_MIN_PERCENTILE", 0.20))
 ATR_MIN_SESSIONS = int(os.getenv("ATR_MIN_SESSIONS", 720))
+SESSION_WORKERS = int(os.getenv("SESSION_WORKERS", 8))  # Concurrent API fetches per session
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Prometheus endpoint on 127.0.0.1:<port>/metrics, 0 disables it
+
+# Price streaming: evaluate stops on every WebSocket ticker update instead of once per session
+PRICE_STREAM = os.getenv("PRICE_STREAM", "false").lower() == "true"
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://ws.kraken.com")
+
+# Kraken API rate limits
+KRAKEN_TIER = os.getenv("KRAKEN_TIER", "starter").lower()  # Options: "starter", "intermediate", "pro"
+PUBLIC_CALLS_PER_SEC = float(os.getenv("PUBLIC_CALLS_PER_SEC", 1))
+PUBLIC_CALLS_BURST = int(os.getenv("PUBLIC_CALLS_BURST", 5))
 
 # Pairs names map and info
 PAIRS = {pair: {} for pair in os.getenv("PAIRS", "").split(",")}
@@ -1,33 +1,84 @@
 import os
+import json
+import queue
+import atexit
 import logging
 import services.telegram as telegram
-from logging.handlers import TimedRotatingFileHandler
-
-os.makedirs("logs", exist_ok=True)
-file_handler = TimedRotatingFileHandler(
-    filename="logs/BoTC.log",
-    when="midnight",
-    interval=1,
-    backupCount=7,
-    encoding="utf-8"
-)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[file_handler, logging.StreamHandler()]
-)
-
-def info(msg, to_telegram=False):
-    logging.info(msg)
-    if to_telegram:
-        telegram.send_notification(msg)
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 
-def warning(msg, to_telegram=False):
-    logging.warning(msg)
-    if to_telegram:
-        telegram.send_notification("⚠️ " + msg)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG adds the per-position chatter
+LOG_JSON = os.getenv("LOG_JSON")  # Optional JSON-lines sink, e.g. logs/BoTC.jsonl
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per record: time, level, message and the typed fields passed to info/debug/...
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "ts": record.created, "level": record.levelname,
+                 "message": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _QueueHandler(QueueHandler):
+    # Records stay in this process, so formatting is left to the listener thread as well
+    def prepare(self, record):
+        return record
+
+class Thousands:
+    # Lazy "{:,}" for %-style arguments: the number is only formatted if the record is emitted
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return f"{self.value:,}"
+
+def _rotating_handler(filename):
+    return TimedRotatingFileHandler(filename=filename, when="midnight", interval=1, backupCount=7, encoding="utf-8")
 
-def error(msg, to_telegram=False):
-    logging.error(msg)
+listener = None
+
+def setup():
+    # Called once from the bot's main(): importing this module configures nothing, so processes that
+    # import the bot's modules (the ATR min worker, tests) keep their own logging
+    global listener
+    if listener:
+        return
+    os.makedirs("logs", exist_ok=True)
+    text_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers = [_rotating_handler("logs/BoTC.log"), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(text_formatter)
+    if LOG_JSON:
+        json_handler = _rotating_handler(LOG_JSON)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    # Callers only enqueue records; file, console and JSON output happen on the listener thread
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logging.basicConfig(level=LOG_LEVEL, handlers=[_QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)
+
+_logger = logging.getLogger()
+
+def _log(level, msg, args, fields, to_telegram=False, prefix=""):
+    # msg is %-formatted with args only if the record is emitted, so disabled levels cost one check
+    if _logger.isEnabledFor(level):
+        _logger.log(level, msg, *args, extra={"fields": fields})
     if to_telegram:
-        telegram.send_notification("❌ " + msg)
\ No newline at end of file
+        telegram.send_notification(prefix + (msg % args if args else msg))
+
+def debug(msg, *args, **fields):
+    _log(logging.DEBUG, msg, args, fields)
+
+def info(msg, *args, to_telegram=False, **fields):
+    _log(logging.INFO, msg, args, fields, to_telegram)
+
+def warning(msg, *args, to_telegram=False, **fields):
+    _log(logging.WARNING, msg, args, fields, to_telegram, "⚠️ ")
+
+def error(msg, *args, to_telegram=False, **fields):
+    _log(logging.ERROR, msg, args, fields, to_telegram, "❌ ")
@@ -0,0 +1,186 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from a fast Ticker call to a full ATR minimum calculation
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.last = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.last = value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-quantile (the max when it falls past the last bound)
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+# All series live in this process and are updated from the session, worker, stream and Telegram threads
+_lock = threading.Lock()
+_stages = {}  # {(stage, pair): Histogram}
+_kraken_latency = {}  # {method: Histogram}
+_kraken_errors = {}  # {(method, kind): count}
+_rate_limit_wait = {}  # {bucket: seconds slept}
+_sessions = Histogram()
+_session_overruns = 0
+_server = None
+
+def observe_stage(stage, seconds, pair=""):
+    with _lock:
+        _stages.setdefault((stage, pair), Histogram()).observe(seconds)
+
+@contextmanager
+def timed(stage, pair=""):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, pair)
+
+def timed_call(stage, pair, func, *args):
+    # For work handed to an executor: times the call where it actually runs
+    with timed(stage, pair):
+        return func(*args)
+
+def observe_kraken(method, seconds):
+    with _lock:
+        _kraken_latency.setdefault(method, Histogram()).observe(seconds)
+
+def count_kraken_error(method, kind):
+    with _lock:
+        _kraken_errors[(method, kind)] = _kraken_errors.get((method, kind), 0) + 1
+
+def observe_rate_limit_wait(bucket, seconds):
+    if seconds <= 0:
+        return
+    with _lock:
+        _rate_limit_wait[bucket] = _rate_limit_wait.get(bucket, 0.0) + seconds
+
+def observe_session(seconds, interval):
+    # Returns whether the session overran its interval
+    global _session_overruns
+    overrun = seconds > interval
+    with _lock:
+        _sessions.observe(seconds)
+        if overrun:
+            _session_overruns += 1
+    return overrun
+
+def _labels(**labels):
+    pairs = [f'{key}="{value}"' for key, value in labels.items() if value != ""]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _histogram_lines(name, histogram, **labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.total}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+def render_prometheus():
+    with _lock:
+        lines = ["# HELP botc_stage_seconds Duration of each session stage, per pair where it applies.",
+                 "# TYPE botc_stage_seconds histogram"]
+        for (stage, pair), histogram in sorted(_stages.items()):
+            lines += _histogram_lines("botc_stage_seconds", histogram, stage=stage, pair=pair)
+
+        lines += ["# HELP botc_kraken_request_seconds Kraken API request latency, excluding rate limit waits.",
+                  "# TYPE botc_kraken_request_seconds histogram"]
+        for method, histogram in sorted(_kraken_latency.items()):
+            lines += _histogram_lines("botc_kraken_request_seconds", histogram, method=method)
+
+        lines += ["# HELP botc_kraken_errors_total Failed Kraken API attempts by kind (network, api, rate_limit).",
+                  "# TYPE botc_kraken_errors_total counter"]
+        for (method, kind), count in sorted(_kraken_errors.items()):
+            lines.append(f"botc_kraken_errors_total{_labels(method=method, kind=kind)} {count}")
+
+        lines += ["# HELP botc_rate_limit_wait_seconds_total Time spent pacing calls in the local rate limiters.",
+                  "# TYPE botc_rate_limit_wait_seconds_total counter"]
+        for bucket, seconds in sorted(_rate_limit_wait.items()):
+            lines.append(f"botc_rate_limit_wait_seconds_total{_labels(bucket=bucket)} {seconds}")
+
+        lines += ["# HELP botc_session_seconds Duration of a whole session, without the sleep that follows it.",
+                  "# TYPE botc_session_seconds histogram"]
+        lines += _histogram_lines("botc_session_seconds", _sessions)
+        lines += ["# HELP botc_session_overruns_total Sessions that took longer than SLEEPING_INTERVAL.",
+                  "# TYPE botc_session_overruns_total counter",
+                  f"botc_session_overruns_total {_session_overruns}"]
+    return "\n".join(lines) + "\n"
+
+def summary():
+    # Plain text for the Telegram /perf command
+    with _lock:
+        if not _sessions.count:
+            return "No session completed yet."
+        lines = [f"Sessions: {_sessions.count} | last {_sessions.last:.2f}s | avg {_sessions.total / _sessions.count:.2f}s | "
+                 f"max {_sessions.max:.2f}s | overruns {_session_overruns}", "", "Stages (last / avg / max):"]
+        for (stage, pair), h in sorted(_stages.items()):
+            name = f"{stage} {pair}".strip()
+            lines.append(f"  {name}: {h.last:.2f}s / {h.total / h.count:.2f}s / {h.max:.2f}s")
+
+        lines += ["", "Kraken (calls, avg, p95 ≤):"]
+        for method, h in sorted(_kraken_latency.items()):
+            lines.append(f"  {method}: {h.count}, {h.total / h.count * 1000:.0f}ms, {h.quantile(0.95) * 1000:.0f}ms")
+        if _kraken_errors:
+            errors = ", ".join(f"{method} {kind} {count}" for (method, kind), count in sorted(_kraken_errors.items()))
+            lines.append(f"  Errors: {errors}")
+        if _rate_limit_wait:
+            waits = ", ".join(f"{bucket} {seconds:.1f}s" for bucket, seconds in sorted(_rate_limit_wait.items()))
+            lines.append(f"  Rate limit waits: {waits}")
+    return "\n".join(lines)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the bot log
+
+def start_metrics_server(port, host="127.0.0.1"):
+    # Local only: put a reverse proxy or SSH tunnel in front to scrape from elsewhere
+    global _server
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+
+def stop_metrics_server():
+    global _server
+    if _server:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
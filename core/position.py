@@ -0,0 +1,86 @@
+from enum import Enum
+
+class _StrEnum(str, Enum):
+    # Compares, hashes, formats and serializes as its plain value ("sell", "dualk")
+    def __str__(self):
+        return self.value
+
+    __format__ = str.__format__
+
+class Side(_StrEnum):
+    SELL = "sell"
+    BUY = "buy"
+
+class Mode(_StrEnum):
+    ONEK = "onek"
+    DUALK = "dualk"
+
+# Persisted field order, as in the JSON state files. Optional fields are omitted while None.
+FIELDS = (
+    "side", "mode", "created_time", "opening_order", "entry_price", "volume", "cost",
+    "activation_atr", "activation_price", "reference_price", "stop_atr", "activation_time",
+    "trailing_price", "stop_price", "pnl", "closing_time"
+)
+FLOAT_FIELDS = {"entry_price", "volume", "cost", "activation_atr", "activation_price", "reference_price",
+                "stop_atr", "trailing_price", "stop_price", "pnl"}
+
+class Position:
+    __slots__ = FIELDS
+
+    def __init__(self, side, mode, entry_price, volume, cost, activation_atr, activation_price,
+                 opening_order=(), created_time=None, reference_price=None, stop_atr=None,
+                 activation_time=None, trailing_price=None, stop_price=None, pnl=None, closing_time=None):
+        self.side = Side(side)
+        self.mode = Mode(mode)
+        self.created_time = created_time
+        self.opening_order = list(opening_order)
+        self.entry_price = entry_price
+        self.volume = volume
+        self.cost = cost
+        self.activation_atr = activation_atr
+        self.activation_price = activation_price
+        self.reference_price = reference_price
+        self.stop_atr = stop_atr
+        self.activation_time = activation_time
+        self.trailing_price = trailing_price
+        self.stop_price = stop_price
+        self.pnl = pnl
+        self.closing_time = closing_time
+
+    @property
+    def reference(self):
+        # Activation is measured from the last recenter price, or from the entry until then
+        return self.entry_price if self.reference_price is None else self.reference_price
+
+    @property
+    def trailing_active(self):
+        return self.trailing_price is not None
+
+    def to_dict(self):
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value is None:
+                continue
+            if field in ("side", "mode"):
+                value = value.value
+            elif field == "opening_order":
+                value = list(value)
+            data[field] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        pos = cls.__new__(cls)
+        for field in FIELDS:
+            value = data.get(field)
+            if value is not None and field in FLOAT_FIELDS:
+                value = float(value)
+            setattr(pos, field, value)
+        pos.side = Side(pos.side)
+        pos.mode = Mode(pos.mode)
+        pos.opening_order = list(pos.opening_order or ())
+        return pos
+
+    def __repr__(self):
+        return f"Position({self.to_dict()})"
@@ -1,40 +1,81 @@
 import threading
+from collections import namedtuple
+from types import MappingProxyType
 
-# Thread-safe shared data between main thread and Telegram thread
+# Shared data between main thread, price stream and Telegram thread, published as immutable versioned
+# snapshots: writers build the next version under the lock, readers take the current one without locking.
+# Unchanged parts are shared between versions, so publishing a change costs only what changed.
+Snapshot = namedtuple("Snapshot", ["version", "last_balance", "pairs_data", "trailing_state"])
+# last_balance: {asset: balance}
+# pairs_data: {pair: {"last_price": float, "atr": float, "atr_min": float, "atr_min_time": float, "atr_min_duration": float}}
+# trailing_state: {pair: {order_id: position fields}}
+
+_EMPTY = MappingProxyType({})
 _lock = threading.Lock()
-_shared_data = {
-    "last_balance": {},
-    "pairs_data": {},  # {pair: {"last_price": float, "atr": float}}
-    "trailing_state": {}  # {pair: {order_id: position_data}}
-}
+_snapshot = Snapshot(0, _EMPTY, _EMPTY, _EMPTY)
+
+def _publish(**changes):
+    # Caller holds _lock; swapping the reference is atomic for readers
+    global _snapshot
+    _snapshot = _snapshot._replace(version=_snapshot.version + 1, **changes)
+
+def get_snapshot():
+    return _snapshot
 
 def update_balance(balance):
     with _lock:
-        _shared_data["last_balance"] = balance if balance else {}
+        _publish(last_balance=MappingProxyType(dict(balance)) if balance else _EMPTY)
 
 def get_last_balance():
-    with _lock:
-        return _shared_data["last_balance"]
+    return _snapshot.last_balance
+
+def _update_pair(pair, **fields):
+    pairs_data = _snapshot.pairs_data
+    pair_data = MappingProxyType({**pairs_data.get(pair, _EMPTY), **fields})
+    _publish(pairs_data=MappingProxyType({**pairs_data, pair: pair_data}))
 
 def update_pair_data(pair, price=None, atr=None):
+    fields = {}
+    if price is not None:
+        fields["last_price"] = price
+    if atr is not None:
+        fields["atr"] = atr
     with _lock:
-        if pair not in _shared_data["pairs_data"]:
-            _shared_data["pairs_data"][pair] = {}
-        if price is not None:
-            _shared_data["pairs_data"][pair]["last_price"] = price
-        if atr is not None:
-            _shared_data["pairs_data"][pair]["atr"] = atr
+        _update_pair(pair, **fields)
 
-def get_pair_data(pair):
+def update_atr_min(pair, atr_min, computed_at, duration):
     with _lock:
-        return _shared_data["pairs_data"].get(pair, {})
+        _update_pair(pair, atr_min=atr_min, atr_min_time=computed_at, atr_min_duration=duration)
 
-def update_trailing_state(trailing_state):
+def get_pair_data(pair):
+    return _snapshot.pairs_data.get(pair, _EMPTY)
+
+def _freeze_position(pos):
+    data = pos.to_dict()
+    data["opening_order"] = tuple(data.get("opening_order", ()))
+    return MappingProxyType(data)
+
+def update_trailing_state(trailing_state, changed=None):
+    # Publishes the positions in changed ({(pair, order_id)}) and reuses the previous version of every
+    # other one; changed=None republishes everything (e.g. after a reload)
+    trailing_state = trailing_state or {}
     with _lock:
-        _shared_data["trailing_state"] = trailing_state if trailing_state else {}
+        previous = _snapshot.trailing_state if changed is not None else _EMPTY
+        changed_pairs = {pair for pair, _ in changed} if changed is not None else trailing_state.keys()
+
+        snapshot = {}
+        for pair, pair_state in trailing_state.items():
+            previous_pair = previous.get(pair)
+            if previous_pair is not None and pair not in changed_pairs:
+                snapshot[pair] = previous_pair
+                continue
+            previous_pair = previous_pair or _EMPTY
+            snapshot[pair] = MappingProxyType({
+                order_id: previous_pair[order_id]
+                if order_id in previous_pair and (pair, order_id) not in changed else _freeze_position(pos)
+                for order_id, pos in pair_state.items()
+            })
+        _publish(trailing_state=MappingProxyType(snapshot))
 
 def get_trailing_state():
-    with _lock:
-        # Return a deep copy to avoid modifications from the reading thread
-        import copy
-        return copy.deepcopy(_shared_data["trailing_state"])
+    return _snapshot.trailing_state
@@ -1,44 +1,225 @@
 import json
 import os
+import time
+import shutil
+from core.position import Position
 
 os.makedirs("data", exist_ok=True)
 STATE_FILE = "data/trailing_state.json"
-CLOSED_FILE = "data/closed_positions.json"
+JOURNAL_FILE = "data/trailing_state.journal"
+PROCESSED_FILE = "data/processed_orders.json"
+CLOSED_FILE = "data/closed_positions.json"  # Legacy single-file history, migrated into CLOSED_DIR
+CLOSED_DIR = "data/closed_positions"
+
+# Trailing state = snapshot + write-ahead journal of position changes since it was written.
+# Each journal line is {"op", "pair", "id", "pos"}: "pos" holds the whole position after the change
+# (create, merge, recenter, atr, activate, trail), or is absent when the position was closed.
+# Closed orders already turned into positions are journaled as {"op": "processed", "id", "time"}.
+# Replaying a line twice gives the same state, so a crash between compaction steps is harmless.
+JOURNAL_COMPACT_ENTRIES = 1000
+
+# Processed orders are remembered well beyond the ClosedOrders lookback window, then forgotten
+PROCESSED_ORDERS_TTL = 7 * 24 * 3600
+
+_pending = {}  # {(pair, order_id): op} changed since the last commit
+_pending_processed = {}  # {order_id: close time} marked since the last commit
+_processed = {}  # {order_id: close time}
+_journal_entries = 0
+
+def journal(op, pair, order_id):
+    # Marks a position as changed; the change is written on the next save_trailing_state
+    _pending[(pair, order_id)] = op
+
+def is_processed(order_id):
+    return order_id in _processed
+
+def mark_processed(order_id, closed_time=None):
+    closed_time = closed_time or time.time()
+    _processed[order_id] = closed_time
+    _pending_processed[order_id] = closed_time
+
+def _expire_processed():
+    cutoff = time.time() - PROCESSED_ORDERS_TTL
+    for order_id in [order_id for order_id, closed_time in _processed.items() if closed_time < cutoff]:
+        del _processed[order_id]
+
+def _apply(state, entry):
+    if entry["op"] == "processed":
+        _processed[entry["id"]] = entry["time"]
+        return
+    pair_state = state.setdefault(entry["pair"], {})
+    if entry.get("pos") is None:
+        pair_state.pop(entry["id"], None)
+    else:
+        pair_state[entry["id"]] = entry["pos"]
+
+def _replay_journal(state):
+    # Applies every complete line; a line torn by a crash mid-append is cut off so new entries follow a newline
+    entries = 0
+    valid_size = 0
+    with open(JOURNAL_FILE, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            _apply(state, entry)
+            entries += 1
+            valid_size += len(line)
+    if valid_size < os.path.getsize(JOURNAL_FILE):
+        os.truncate(JOURNAL_FILE, valid_size)
+    return entries
 
 def load_trailing_state():
+    global _journal_entries
+    state = {}
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    return {}
+            state = json.load(f)
+    _processed.clear()
+    if os.path.exists(PROCESSED_FILE):
+        with open(PROCESSED_FILE, "r") as f:
+            _processed.update(json.load(f))
+    _journal_entries = _replay_journal(state) if os.path.exists(JOURNAL_FILE) else 0
+    _pending.clear()
+    _pending_processed.clear()
+    state = {pair: {order_id: Position.from_dict(pos) for order_id, pos in pair_state.items()}
+             for pair, pair_state in state.items()}
+
+    # Opening orders of open positions are processed by definition (covers state written before the index)
+    now = time.time()
+    for pair_state in state.values():
+        for pos in pair_state.values():
+            for order_id in pos.opening_order:
+                if order_id not in _processed:
+                    mark_processed(order_id, now)
+    _expire_processed()
+    return state
+
+def state_to_dict(state):
+    return {pair: {order_id: pos.to_dict() for order_id, pos in pair_state.items()}
+            for pair, pair_state in state.items()}
+
+def _write_snapshot(path, data, indent=None):
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
 
 def save_trailing_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
+    # Appends the changed positions to the journal; rewrites the snapshot only once the journal grows long.
+    # Returns whether anything was written.
+    global _journal_entries
+    if not _pending and not _pending_processed:
+        return False
 
-def load_closed_positions():
-    if os.path.exists(CLOSED_FILE):
-        with open(CLOSED_FILE, "r") as f:
-            return json.load(f)
-    return {}
+    lines = []
+    for (pair, order_id), op in _pending.items():
+        entry = {"op": op, "pair": pair, "id": order_id}
+        pos = state.get(pair, {}).get(order_id)
+        if pos is not None:
+            entry["pos"] = pos.to_dict()
+        lines.append(json.dumps(entry) + "\n")
+    for order_id, closed_time in _pending_processed.items():
+        lines.append(json.dumps({"op": "processed", "id": order_id, "time": closed_time}) + "\n")
+    _pending.clear()
+    _pending_processed.clear()
 
-def save_closed_position(pos, order_id, pair):
-    if os.path.exists(CLOSED_FILE):
+    with open(JOURNAL_FILE, "a") as f:
+        f.write("".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    _journal_entries += len(lines)
+
+    if _journal_entries >= JOURNAL_COMPACT_ENTRIES:
+        compact_trailing_state(state)
+    return True
+
+def compact_trailing_state(state):
+    # Folds the journal and any pending change into the snapshots, leaving data/trailing_state.json
+    # complete (e.g. before editing it by hand)
+    global _journal_entries
+    if _journal_entries == 0 and not _pending and not _pending_processed and os.path.exists(STATE_FILE):
+        return
+    _write_snapshot(STATE_FILE, state_to_dict(state), indent=2)
+    _expire_processed()
+    _write_snapshot(PROCESSED_FILE, _processed)
+    # Snapshots first: if the truncate is lost, replaying the old journal over them changes nothing
+    if os.path.exists(JOURNAL_FILE):
+        os.truncate(JOURNAL_FILE, 0)
+    _journal_entries = 0
+    _pending.clear()
+    _pending_processed.clear()
+
+def _closed_segment(pair, closing_time, base_dir=CLOSED_DIR):
+    # One JSON-lines file per pair and closing month: data/closed_positions/XBTEUR/2025-01.jsonl
+    return os.path.join(base_dir, pair, f"{closing_time[:7]}.jsonl")
+
+def _migrate_closed_positions():
+    # One-time split of the legacy single-file history into monthly segments, built aside and
+    # moved in place so an interrupted migration never leaves duplicated records
+    if not os.path.exists(CLOSED_FILE):
+        return
+    if not os.path.isdir(CLOSED_DIR):
         with open(CLOSED_FILE, "r") as f:
             closed_positions = json.load(f)
-    else:
-        closed_positions = {}
-    
-    if pair not in closed_positions:
-        closed_positions[pair] = {}
-    
-    closed_positions[pair][order_id] = pos
-    
-    with open(CLOSED_FILE, "w") as f:
-        json.dump(closed_positions, f, indent=2)
-
-def is_processed(order_id, state):
-    for pos in state.values():
-        opening_orders = pos.get("opening_order")
-        if opening_orders and order_id in opening_orders:
-            return True
-    return False
\ No newline at end of file
+        tmp_dir = CLOSED_DIR + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for pair, positions in closed_positions.items():
+            by_time = sorted(positions.items(), key=lambda item: item[1].get("closing_time") or "")
+            for order_id, pos in by_time:
+                _append_closed_position(pos, order_id, pair, base_dir=tmp_dir, sync=False)
+        os.makedirs(tmp_dir, exist_ok=True)
+        os.replace(tmp_dir, CLOSED_DIR)
+    os.replace(CLOSED_FILE, CLOSED_FILE + ".migrated")
+
+def _append_closed_position(pos, order_id, pair, base_dir=CLOSED_DIR, sync=True):
+    closing_time = pos.get("closing_time") or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    segment = _closed_segment(pair, closing_time, base_dir)
+    os.makedirs(os.path.dirname(segment), exist_ok=True)
+    line = json.dumps({"id": order_id, "pos": pos}) + "\n"
+    with open(segment, "ab+") as f:
+        # Start on a fresh line if a previous append was torn by a crash
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line
+        f.write(line.encode())
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+
+def load_closed_positions(pair=None, start=None, end=None):
+    # Streams (pair, order_id, position) in closing order per pair, optionally for one pair and for
+    # closing times in [start, end) given as "YYYY-MM-DD HH:MM:SS" (or any prefix, e.g. "2025-01").
+    # Only the monthly segments overlapping the range are opened.
+    _migrate_closed_positions()
+    if not os.path.isdir(CLOSED_DIR):
+        return
+    pairs = [pair] if pair else sorted(os.listdir(CLOSED_DIR))
+    for pair_name in pairs:
+        pair_dir = os.path.join(CLOSED_DIR, pair_name)
+        if not os.path.isdir(pair_dir):
+            continue
+        for segment in sorted(os.listdir(pair_dir)):
+            month = segment[:7]
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            with open(os.path.join(pair_dir, segment), "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn by a crash mid-append
+                    closing_time = entry["pos"].get("closing_time") or ""
+                    if (start and closing_time < start) or (end and closing_time >= end):
+                        continue
+                    yield pair_name, entry["id"], entry["pos"]
+
+def save_closed_position(pos, order_id, pair):
+    _migrate_closed_positions()
+    _append_closed_position(pos, order_id, pair)
@@ -0,0 +1,146 @@
+import math
+from bisect import bisect_left, bisect_right, insort
+from core.position import Mode
+
+SIDES = ("sell", "buy")
+
+# Relative slack for thresholds derived with float arithmetic (recenter distance, ATR bands): the index
+# returns a superset there and the caller's exact checks decide
+EPSILON = 1e-9
+
+class _SortedKeys:
+    # (value, seq) pairs kept sorted, so value ranges are answered with bisect
+    def __init__(self):
+        self.items = []
+
+    def add(self, value, seq):
+        insort(self.items, (value, seq))
+
+    def remove(self, value, seq):
+        i = bisect_left(self.items, (value, seq))
+        del self.items[i]
+
+    def below(self, value, inclusive=True):
+        i = bisect_right(self.items, (value, math.inf)) if inclusive else bisect_left(self.items, (value, -math.inf))
+        return [seq for _, seq in self.items[:i]]
+
+    def above(self, value, inclusive=True):
+        i = bisect_left(self.items, (value, -math.inf)) if inclusive else bisect_right(self.items, (value, math.inf))
+        return [seq for _, seq in self.items[i:]]
+
+    def between(self, low, high, low_inclusive, high_inclusive):
+        i = bisect_left(self.items, (low, -math.inf)) if low_inclusive else bisect_right(self.items, (low, math.inf))
+        j = bisect_right(self.items, (high, math.inf)) if high_inclusive else bisect_left(self.items, (high, -math.inf))
+        return [seq for _, seq in self.items[i:j]]
+
+class TriggerIndex:
+    # Positions of one pair indexed by the prices and ATR anchors their next transition depends on:
+    # activation price and ATR while inactive, stop, trailing price and stop ATR once trailing.
+    # Inactive positions are also indexed by reference price per (mode, side) for merge lookups.
+    # Sequence numbers follow insertion, so results come back in the pair state's order.
+    def __init__(self):
+        self._next_seq = 0
+        self._ids = {}  # seq -> order_id
+        self._entries = {}  # order_id -> (seq, indexed keys)
+        self._keys = {(side, name): _SortedKeys() for side in SIDES
+                      for name in ("activation", "activation_atr", "stop", "trailing", "stop_atr")}
+        self._keys.update({(mode.value, side, "reference"): _SortedKeys() for mode in Mode for side in SIDES})
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _position_keys(pos):
+        side = pos.side.value
+        if pos.trailing_price is None:
+            return (((side, "activation"), pos.activation_price), ((side, "activation_atr"), pos.activation_atr),
+                    ((pos.mode.value, side, "reference"), pos.reference))
+        return (((side, "stop"), pos.stop_price), ((side, "trailing"), pos.trailing_price),
+                ((side, "stop_atr"), pos.stop_atr))
+
+    def update(self, order_id, pos):
+        # Re-indexes a changed position, or drops it when pos is None (closed)
+        entry = self._entries.pop(order_id, None)
+        if entry:
+            seq, keys = entry
+            for name, value in keys:
+                self._keys[name].remove(value, seq)
+        if pos is None:
+            if entry:
+                del self._ids[entry[0]]
+            return
+
+        if entry:
+            seq = entry[0]
+        else:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._ids[seq] = order_id
+        keys = self._position_keys(pos)
+        for name, value in keys:
+            self._keys[name].add(value, seq)
+        self._entries[order_id] = (seq, keys)
+
+    def rebuild(self, pair_state):
+        self.__init__()
+        for order_id, pos in pair_state.items():
+            self.update(order_id, pos)
+
+    def _crossed(self, price):
+        keys = self._keys
+        seqs = set()
+        seqs.update(keys[("sell", "activation")].below(price))  # price >= activation
+        seqs.update(keys[("buy", "activation")].above(price))  # price <= activation
+        seqs.update(keys[("sell", "stop")].above(price))  # price <= stop
+        seqs.update(keys[("buy", "stop")].below(price))  # price >= stop
+        seqs.update(keys[("sell", "trailing")].below(price, inclusive=False))  # price > trailing
+        seqs.update(keys[("buy", "trailing")].above(price, inclusive=False))  # price < trailing
+        return seqs
+
+    def _crossed_since(self, previous, price):
+        # Conditions that hold at price but did not at previous: the threshold lies between both prices
+        keys = self._keys
+        seqs = set()
+        if price > previous:
+            seqs.update(keys[("sell", "activation")].between(previous, price, False, True))
+            seqs.update(keys[("buy", "stop")].between(previous, price, False, True))
+            seqs.update(keys[("sell", "trailing")].between(previous, price, True, False))
+        elif price < previous:
+            seqs.update(keys[("buy", "activation")].between(price, previous, True, False))
+            seqs.update(keys[("sell", "stop")].between(price, previous, True, False))
+            seqs.update(keys[("buy", "trailing")].between(price, previous, False, True))
+        return seqs
+
+    def crossed(self, price, previous=None):
+        # Exactly the positions whose activation, stop or trailing price is crossed at this price or, given
+        # the previous price, crossed on the way from it: a price that stays past a threshold fires once
+        seqs = self._crossed(price) if previous is None else self._crossed_since(previous, price)
+        return [self._ids[seq] for seq in sorted(seqs)]
+
+    def candidates(self, price, atr_by_side, recenter_by_side):
+        # Crossed positions plus those that may need a recenter (activation further than the side's
+        # recenter threshold) or an ATR recalibration (anchor outside [atr / 1.2, atr / 0.8])
+        seqs = self._crossed(price)
+        for side in SIDES:
+            threshold = recenter_by_side[side]
+            if threshold > 0:
+                slack = EPSILON * max(abs(price), threshold, 1.0)
+                seqs.update(self._keys[(side, "activation")].below(price - threshold + slack))
+                seqs.update(self._keys[(side, "activation")].above(price + threshold - slack))
+
+            atr_val = atr_by_side[side]
+            slack = EPSILON * max(atr_val, 1.0)
+            for name in ("activation_atr", "stop_atr"):
+                seqs.update(self._keys[(side, name)].above(atr_val / 0.8 - slack))
+                seqs.update(self._keys[(side, name)].below(atr_val / 1.2 + slack))
+        return [self._ids[seq] for seq in sorted(seqs)]
+
+    def merge_candidates(self, mode, side, price, max_diff_pct):
+        # Inactive positions whose reference price may be within max_diff_pct of price, in insertion order:
+        # |reference - price| / reference * 100 < pct  <=>  price / (1 + pct/100) < reference < price / (1 - pct/100)
+        ratio = max_diff_pct / 100
+        slack = EPSILON * max(abs(price), 1.0)
+        references = self._keys[(mode, side, "reference")]
+        low = bisect_left(references.items, (price / (1 + ratio) - slack, -math.inf))
+        high = bisect_right(references.items, (price / (1 - ratio) + slack, math.inf))
+        return [self._ids[seq] for seq in sorted(seq for _, seq in references.items[low:high])]
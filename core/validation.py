@@ -13,7 +13,13 @@ from core.config import (
     SLEEPING_INTERVAL,
     ATR_DATA_DAYS,
     ATR_INTERVAL,
-    ATR_PERIOD
+    ATR_PERIOD,
+    KRAKEN_TIER,
+    PUBLIC_CALLS_PER_SEC,
+    PUBLIC_CALLS_BURST,
+    SESSION_WORKERS,
+    PRICE_STREAM,
+    PRICE_STREAM_URL
 )
 
 def validate_common_params(errors):
@@ -37,6 +43,13 @@ def validate_common_params(errors):
     if not PAIRS or not any(PAIRS.keys()):
         errors.append("PAIRS is missing or empty")
 
+    if KRAKEN_TIER not in ["starter", "intermediate", "pro"]:
+        errors.append(f"Invalid KRAKEN_TIER '{KRAKEN_TIER}'. Must be 'starter', 'intermediate' or 'pro'")
+    if PUBLIC_CALLS_PER_SEC <= 0 or PUBLIC_CALLS_BURST < 1:
+        errors.append("PUBLIC_CALLS_PER_SEC must be > 0 and PUBLIC_CALLS_BURST >= 1")
+    if SESSION_WORKERS < 1:
+        errors.append("SESSION_WORKERS must be >= 1")
+
 def build_and_validate_pairs(errors):
     try:
         build_pairs_map(PAIRS)
@@ -118,7 +131,9 @@ def log_configuration_summary():
     logging.info(f"Mode: {MODE}")
     logging.info(f"Session interval: {SLEEPING_INTERVAL}s")
     logging.info(f"Telegram polling interval: {POLL_INTERVAL_SEC}s")
+    logging.info(f"Price stream: {PRICE_STREAM_URL if PRICE_STREAM else 'disabled'}")
     logging.info(f"ATR: {ATR_INTERVAL}min candles | {ATR_PERIOD} period | {ATR_DATA_DAYS} days data")
+    logging.info(f"Kraken tier: {KRAKEN_TIER} | Public calls: {PUBLIC_CALLS_PER_SEC}/s (burst {PUBLIC_CALLS_BURST}) | Workers: {SESSION_WORKERS}")
     logging.info("-" * 60)
     
     # Trading parameters per pair
@@ -0,0 +1,108 @@
+import time
+import random
+import logging
+import threading
+import krakenex
+import requests
+from requests.adapters import HTTPAdapter
+import core.metrics as metrics
+from exchange.rate_limiter import public_bucket, private_bucket, PRIVATE_CALL_COSTS
+
+# Per-endpoint request timeouts in seconds
+ENDPOINT_TIMEOUTS = {
+    "AssetPairs": 15,
+    "Ticker": 5,
+    "OHLC": 10,
+    "Balance": 10,
+    "ClosedOrders": 15,
+    "AddOrder": 10
+}
+DEFAULT_TIMEOUT = 10
+
+# Kraken errors that are worth retrying after a backoff
+TRANSIENT_ERRORS = (
+    "EAPI:Rate limit",
+    "EOrder:Rate limit",
+    "EGeneral:Temporary",
+    "EGeneral:Internal error",
+    "EService:Unavailable",
+    "EService:Busy",
+    "EService:Deadline elapsed"
+)
+RATE_LIMIT_ERRORS = ("EAPI:Rate limit", "EOrder:Rate limit", "EGeneral:Temporary lockout")
+
+# A timed-out or failed AddOrder may still have reached the book: it is only retried after a rate limit
+# rejection, which the engine never accepted, and every other error goes back to the caller
+NON_IDEMPOTENT = {"AddOrder", "CancelOrder"}
+
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+class KrakenError(Exception):
+    pass
+
+class KrakenClient:
+    def __init__(self, key, secret, pool_size=10):
+        self.api = krakenex.API(key, secret)
+        # Persistent keep-alive connections shared by all session workers
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.api.session.mount("https://", adapter)
+        # Private calls are serialized so nonces always reach Kraken in increasing order
+        self._private_lock = threading.Lock()
+
+    def public(self, method, data=None):
+        return self._call(method, data, private=False)
+
+    def private(self, method, data=None):
+        return self._call(method, data, private=True)
+
+    def _send(self, method, data, private):
+        timeout = ENDPOINT_TIMEOUTS.get(method, DEFAULT_TIMEOUT)
+        if private:
+            with self._private_lock:
+                metrics.observe_rate_limit_wait("private", private_bucket.acquire(PRIVATE_CALL_COSTS.get(method, 1)))
+                return self._timed_query(self.api.query_private, method, data, timeout)
+        metrics.observe_rate_limit_wait("public", public_bucket.acquire(1))
+        return self._timed_query(self.api.query_public, method, data, timeout)
+
+    @staticmethod
+    def _timed_query(query, method, data, timeout):
+        # Latency of the request itself, failed ones included; rate limiter waits are counted apart
+        started = time.perf_counter()
+        try:
+            return query(method, data, timeout=timeout)
+        finally:
+            metrics.observe_kraken(method, time.perf_counter() - started)
+
+    def _call(self, method, data, private):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self._send(method, data, private)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = getattr(e.response, "status_code", None)
+                metrics.count_kraken_error(method, "rate_limit" if status == 429 else "network")
+                retryable = status is None or status == 429 or status >= 500
+                if method in NON_IDEMPOTENT or not retryable or attempt == MAX_RETRIES:
+                    raise KrakenError(f"{method}: {e}") from e
+                error = str(e)
+            else:
+                errors = response.get("error") or []
+                if not errors:
+                    return response.get("result", {})
+                rate_limited = any(err.startswith(RATE_LIMIT_ERRORS) for err in errors)
+                metrics.count_kraken_error(method, "rate_limit" if rate_limited else "api")
+                if method in NON_IDEMPOTENT:
+                    retryable = all(err.startswith(RATE_LIMIT_ERRORS) for err in errors)
+                else:
+                    retryable = any(err.startswith(TRANSIENT_ERRORS) for err in errors)
+                if not retryable or attempt == MAX_RETRIES:
+                    raise KrakenError(errors)
+                if rate_limited:
+                    # Kraken's counter is ahead of our local model: resync before retrying
+                    (private_bucket if private else public_bucket).drain()
+                error = errors
+
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logging.warning(f"Kraken {method} failed ({error}). Retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s.")
+            time.sleep(delay)
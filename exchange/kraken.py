@@ -1,26 +1,34 @@
-import os
-import krakenex
+import time
 import logging
-import pandas as pd
-from datetime import datetime, timedelta
-from pykrakenapi import KrakenAPI
-from core.config import KRAKEN_API_KEY, KRAKEN_API_SECRET, ATR_DATA_DAYS, ATR_INTERVAL, ATR_PERIOD
+import numpy as np
+from core.config import KRAKEN_API_KEY, KRAKEN_API_SECRET, ATR_DATA_DAYS, ATR_INTERVAL, ATR_PERIOD, SESSION_WORKERS
+from core.candle_store import CandleStore, CANDLE_DTYPE
+from exchange.client import KrakenClient
+from utils.atr_engine import AtrEngine
 
 ## Ignore future warnings
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-api = krakenex.API()
-api.key = KRAKEN_API_KEY
-api.secret = KRAKEN_API_SECRET
-krakenapi = KrakenAPI(api)
+# Session workers, the Telegram thread and the main thread share one connection pool, opened by init_client()
+client = None
+
+# Per-pair incremental ATR state, seeded from the candle store on first use
+_atr_engines = {}
+_candle_stores = {}
+
+# Closed orders within the lookback window and the latest close time already fetched
+_closed_orders = {}
+_closed_orders_cursor = 0
+
+def init_client():
+    global client
+    if client is None:
+        client = KrakenClient(KRAKEN_API_KEY, KRAKEN_API_SECRET, pool_size=SESSION_WORKERS + 2)
 
 def get_asset_pairs():
     try:
-        response = api.query_public("AssetPairs")
-        if "error" in response and response["error"]:
-            raise Exception(response["error"])
-        return response.get("result", {})
+        return client.public("AssetPairs")
     except Exception as e:
         logging.error(f"Error fetching asset pairs: {e}")
 
@@ -42,94 +50,127 @@ def build_pairs_map(pairs_dict):
 
 def get_balance():
     try:
-        response = api.query_private("Balance")
-        if "error" in response and response["error"]:
-            raise Exception(response["error"])
-        return response.get("result", {})
+        return client.private("Balance")
     except Exception as e:
         logging.error(f"Error fetching balance: {e}")
         return {}
 
-def get_closed_orders(start=0, closed_after=0):
+def get_closed_orders_by_pair(closed_after=0):
+    # One incremental fetch per session: only closures after the cursor are requested and
+    # the lookback window is served from the local cache, grouped by pair
+    global _closed_orders_cursor
     try:
-        response = api.query_private("ClosedOrders", { "start": start })
-        if "error" in response and response["error"]:
-            raise Exception(response["error"])
-        closed_orders = response.get("result", {}).get("closed", {})
-        closed_orders = {
-            oid: o for oid, o in closed_orders.items() 
-            if o.get("status") == "closed" and o.get("closetm", 0) >= closed_after
-        }
-        return closed_orders
+        start = max(closed_after, _closed_orders_cursor)
+        # Pages come newest first: the cursor only moves once every page is in, so a failed page is
+        # requested again next session instead of being skipped
+        cursor = _closed_orders_cursor
+        offset = 0
+        while True:
+            result = client.private("ClosedOrders", {"start": start, "closetime": "close", "ofs": offset})
+            page = result.get("closed", {})
+
+            for oid, o in page.items():
+                cursor = max(cursor, float(o.get("closetm", 0)))
+                if o.get("status") == "closed":
+                    _closed_orders[oid] = o
+
+            offset += len(page)
+            if not page or offset >= int(result.get("count", 0)):
+                break
+        _closed_orders_cursor = cursor
     except Exception as e:
         logging.error(f"Error fetching closed orders: {e}")
-        return {}
 
-def get_last_price(pair):
+    for oid in [oid for oid, o in _closed_orders.items() if float(o.get("closetm", 0)) < closed_after]:
+        del _closed_orders[oid]
+
+    closed_by_pair = {}
+    for oid, o in _closed_orders.items():
+        order_pair = o.get("descr", {}).get("pair", "")
+        closed_by_pair.setdefault(order_pair, {})[oid] = o
+    return closed_by_pair
+
+def get_last_prices(pairs):
+    # Single Ticker round trip for every pair: {pair: last trade price}
     try:
-        response = api.query_public("Ticker", {"pair": pair})
-        if "error" in response and response["error"]:
-            raise Exception(response["error"])
-        return float(response["result"][pair]["c"][0])  # 'c' = last trade price
+        result = client.public("Ticker", {"pair": ",".join(pairs)})
+        return {pair: float(result[pair]["c"][0]) for pair in pairs if pair in result}  # 'c' = last trade price
     except Exception as e:
-        logging.error(f"Error fetching current price for {pair}: {e}")
-        return None
+        logging.error(f"Error fetching current prices for {', '.join(pairs)}: {e}")
+        return {}
 
 def place_limit_order(pair, side, price, volume):
     try:
-        response = api.query_private("AddOrder", {
+        result = client.private("AddOrder", {
             "pair": pair,
             "type": side,
             "ordertype": "limit",
             "price": str(round(price, 1)),
             "volume": str(volume),
         })
-        if "error" in response and response["error"]:
-            raise Exception(response["error"])
-        new_order = response.get('result', {}).get('txid', [None])[0]
+        new_order = result.get('txid', [None])[0]
         logging.info(f"Created LIMIT {side.upper()} order {new_order} | {volume:.8f} BTC @ {price:,.1f}€)")
         return new_order
     except Exception as e:
         logging.error(f"Error creating {side.upper()} order: {e}")
     
+def get_ohlc(pair, since=None):
+    # Raw OHLC rows [time, open, high, low, close, vwap, volume, count], oldest first;
+    # the last row is the current, not-yet-closed candle
+    data = {"pair": pair, "interval": ATR_INTERVAL}
+    if since is not None:
+        data["since"] = since
+    result = client.public("OHLC", data)
+    return next(rows for key, rows in result.items() if key != "last")
+
+def _fold_candles(rows, engine):
+    # Fold closed candles into the engine and build their fixed-width store records
+    records = np.zeros(len(rows), dtype=CANDLE_DTYPE)
+    for i, row in enumerate(rows):
+        candle_time = int(row[0])
+        high, low, close = float(row[2]), float(row[3]), float(row[4])
+        tr, atr = engine.fold(candle_time, high, low, close)
+        records[i] = (candle_time, float(row[1]), high, low, close, float(row[5]), float(row[6]), int(row[7]), tr, atr)
+    return records
+
+def _seed_atr_engine(pair):
+    store = CandleStore(pair)
+    store.import_legacy_csv()
+    store.trim(int(time.time()) - ATR_DATA_DAYS * 86400)
+
+    engine = AtrEngine(ATR_PERIOD)
+    candles = store.read()
+    for candle_time, high, low, close in zip(candles["time"].tolist(), candles["high"].tolist(),
+                                             candles["low"].tolist(), candles["close"].tolist()):
+        engine.fold(candle_time, high, low, close)
+
+    _atr_engines[pair] = engine
+    _candle_stores[pair] = store
+    return engine
+
 def get_current_atr(pair):
     try:
-        atr_file = f"data/{pair}_atr_data_{ATR_INTERVAL}min.csv"
-        since_param = None
-        existing_df = None
-        
-        if os.path.exists(atr_file):
-            try:
-                existing_df = pd.read_csv(atr_file, index_col=0, parse_dates=True)
-                if not existing_df.empty:
-                    last_timestamp = int(existing_df.index[-1].timestamp())
-                    since_param = last_timestamp
-            except Exception as e:
-                existing_df = None
-        
-        df, _ = krakenapi.get_ohlc_data(pair, interval=ATR_INTERVAL, since=since_param)
-        df = df.sort_index()
-        
-        if existing_df is not None and not existing_df.empty:
-            df = pd.concat([existing_df, df])
-            df = df[~df.index.duplicated(keep='last')]
-            df = df.sort_index()
-        
-        cutoff_date = datetime.now() - timedelta(days=ATR_DATA_DAYS)
-        df = df[df.index >= cutoff_date]
-        
-        df["H-L"] = df["high"] - df["low"]
-        df["H-PC"] = (df["high"] - df["close"].shift(1)).abs()
-        df["L-PC"] = (df["low"] - df["close"].shift(1)).abs()
-        df["TR"] = df[["H-L", "H-PC", "L-PC"]].max(axis=1)
-        df["ATR"] = df["TR"].rolling(ATR_PERIOD).mean()       
-        df.to_csv(atr_file)
-        
-        current_atr = df["ATR"].iloc[-1]
-        return current_atr
+        engine = _atr_engines.get(pair) or _seed_atr_engine(pair)
+        store = _candle_stores[pair]
+
+        rows = get_ohlc(pair, since=engine.last_time)
+        if engine.last_time is not None:
+            rows = [row for row in rows if int(row[0]) > engine.last_time]
+
+        # Only newly closed candles are folded in and appended; the last one is still open
+        closed = rows[:-1]
+        live = rows[-1:]
+        if closed:
+            store.append(_fold_candles(closed, engine))
+            store.trim(int(time.time()) - ATR_DATA_DAYS * 86400)
+
+        if not live:
+            return engine.atr()
+        return engine.peek(float(live[0][2]), float(live[0][3]))
     except Exception as e:
         logging.error(f"Error getting ATR for {pair}: {e}")
         return None
 
 if __name__ == "__main__":
+    init_client()
     print(get_balance())
\ No newline at end of file
@@ -0,0 +1,54 @@
+import threading
+import time
+from core.config import KRAKEN_TIER, PUBLIC_CALLS_PER_SEC, PUBLIC_CALLS_BURST
+
+# Private API counter per verification tier: (max counter, decay per second)
+PRIVATE_TIERS = {
+    "starter": (15, 0.33),
+    "intermediate": (20, 0.5),
+    "pro": (20, 1.0)
+}
+
+# Ledger/trade history calls cost 2, order placement/cancellation is not counted, everything else costs 1
+PRIVATE_CALL_COSTS = {
+    "ClosedOrders": 2,
+    "QueryOrders": 2,
+    "TradesHistory": 2,
+    "QueryTrades": 2,
+    "Ledgers": 2,
+    "QueryLedgers": 2,
+    "AddOrder": 0,
+    "CancelOrder": 0
+}
+
+class TokenBucket:
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        # Reserve the tokens up front (the balance may go negative) so concurrent callers
+        # queue up in arrival order and each sleeps only for its own share of the refill
+        if cost <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+            self._updated = now
+            self._tokens -= cost
+            delay = -self._tokens / self.refill_rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def drain(self):
+        # Called when the exchange reports the limit was hit anyway: start refilling from empty
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = time.monotonic()
+
+public_bucket = TokenBucket(PUBLIC_CALLS_BURST, PUBLIC_CALLS_PER_SEC)
+private_bucket = TokenBucket(*PRIVATE_TIERS.get(KRAKEN_TIER, PRIVATE_TIERS["starter"]))
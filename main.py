@@ -1,40 +1,86 @@
 import time
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import core.logging as logging
 import core.runtime as runtime
+import core.metrics as metrics
 import services.telegram as telegram
+import services.price_stream as price_stream
 import strategies.dualk as dualk_mode
 import strategies.onek as onek_mode
 import utils.atr_manager as atr_manager
-from exchange.kraken import get_balance, get_last_price, get_current_atr, get_closed_orders, place_limit_order
-from core.state import load_trailing_state, save_trailing_state, is_processed, save_closed_position
-from core.config import PAIRS, SLEEPING_INTERVAL, MODE, ASSET_MIN_ALLOCATION, RECENTER_PARAMS, ATR_MIN_SESSIONS
+from exchange.kraken import init_client, get_balance, get_last_prices, get_current_atr, get_closed_orders_by_pair, place_limit_order
+from core.state import load_trailing_state, save_trailing_state, compact_trailing_state, journal, is_processed, mark_processed, save_closed_position
+from core.config import PAIRS, SLEEPING_INTERVAL, MODE, ASSET_MIN_ALLOCATION, RECENTER_PARAMS, ATR_MIN_SESSIONS, SESSION_WORKERS, PRICE_STREAM, METRICS_PORT
 from core.validation import validate_config
+from core.position import Position
+from core.trigger_index import TriggerIndex
+
+# Trailing state lives in memory for the life of the process and is shared with the price stream
+# thread: every load, mutation and save holds the lock
+_state_lock = threading.Lock()
+_trailing_state = {}
+_trigger_indexes = {}  # {pair: TriggerIndex}, kept in step with _trailing_state through touch()
+_unpublished = set()  # {(pair, order_id)} changed since the last runtime snapshot
+_closing = set()  # {(pair, order_id)} whose closing order is being placed, left alone until it returns
+_last_evaluated_price = {}  # {pair: price} the pair's positions were last checked at, by session or stream
+_blocked_notified = {}  # {(pair, order_id): time} of the last [BLOCKED] notification sent to Telegram
+_effective_atr = {}
+
+# Stream-triggered closes run here, so Kraken calls and retries never hold up the WebSocket's event loop
+_close_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="close")
+
+MERGE_THRESHOLD_PCT = 0.5  # A fill this close to an inactive position's reference price is merged into it
+BLOCKED_NOTIFY_INTERVAL = SLEEPING_INTERVAL  # A position still blocked on later checks is notified at most once per interval
 
 def main():
+    # Nothing is set up at import time, so a spawned worker process can import this module safely
+    logging.setup()
+    init_client()
+
     # Validate configuration before starting
     if not validate_config():
         sys.exit(1)
     
+    session_pool = ThreadPoolExecutor(max_workers=SESSION_WORKERS, thread_name_prefix="session")
     try:
+        reload_trailing_state()
         telegram.initialize_telegram()
+        if METRICS_PORT:
+            metrics.start_metrics_server(METRICS_PORT)
+
+        # Trading starts with ATR minimums in place; later refreshes run in the background
+        atr_manager.start_atr_min_worker()
+        logging.info("Calculating ATR minimums...")
+        wait(atr_manager.refresh_atr_min(PAIRS.keys()))
+
+        if PRICE_STREAM:
+            price_stream.initialize_price_stream(PAIRS, on_stream_price)
         session_count = 0
 
         while True:
+            if telegram.RELOAD_REQUESTED:
+                telegram.RELOAD_REQUESTED = False
+                reload_trailing_state()
+                logging.info("🔁 Trailing state reloaded from disk.", to_telegram=True)
+
             if telegram.BOT_PAUSED:
+                # Leave a complete snapshot on disk while paused, so it can be edited and reloaded
+                with _state_lock:
+                    compact_trailing_state(_trailing_state)
                 logging.info("Bot is paused. Sleeping...\n")
                 time.sleep(SLEEPING_INTERVAL)
                 continue
 
             logging.info("======== STARTING SESSION ========")
+            session_started = time.perf_counter()
 
-            # Calculate ATR minimums every ATR_MIN_SESSIONS
-            if session_count % ATR_MIN_SESSIONS == 0:
-                logging.info("Calculating ATR minimums...")
-                for pair in PAIRS.keys():
-                    PAIRS[pair]["atr_min"] = atr_manager.calculate_atr_min(pair)
+            # Refresh ATR minimums every ATR_MIN_SESSIONS without holding up this session
+            if session_count and session_count % ATR_MIN_SESSIONS == 0:
+                logging.info("Refreshing ATR minimums in the background...")
+                atr_manager.refresh_atr_min(PAIRS.keys())
             
-            trailing_state = load_trailing_state()
             current_balance = get_balance()
             
             if not current_balance:
@@ -45,61 +91,179 @@ def main():
                 runtime.update_balance(current_balance)
             
             two_session_ago = int(time.time()) - SLEEPING_INTERVAL * 2
-            one_week_ago = int(time.time()) - (60 * 60 * 24 * 7)
-            
-            for pair in PAIRS.keys():
-                current_price = get_last_price(PAIRS[pair]["primary"])
-                current_atr = get_current_atr(pair)
 
-                if current_price is None or current_atr is None:
-                    logging.error(f"Could not fetch price or ATR for {pair}. Skipping this pair.\n")
-                    continue
-                else:
-                    logging.info(f"[{pair}] Market: {current_price:,.1f}€ | ATR: {current_atr:,.1f}€")
-                    runtime.update_pair_data(pair, price=current_price, atr=current_atr)
-
-                    atr_min_val = PAIRS[pair].get("atr_min", 0.0)
-                    effective_atr = max(current_atr, atr_min_val)
-                    if current_atr < atr_min_val:
-                        logging.info(f"[{pair}] ATR ({current_atr:.4f}) < Min ({atr_min_val:.4f}). Using min.")
-                
-                if pair not in trailing_state:
-                    trailing_state[pair] = {}
-                pair_state = trailing_state[pair]
-                
-                closed_orders = get_closed_orders(one_week_ago, two_session_ago)
-                if closed_orders:
-                    for order_id, order in closed_orders.items():
-                        order_pair = order.get("descr", {}).get("pair", "")
-                        if order_pair != pair:
-                            continue
-                        if is_processed(order_id, pair_state):
-                            continue
-                        process_closed_order(order_id, order, pair_state, effective_atr, pair)
-                
-                update_trailing_state(pair_state, pair, current_price, effective_atr, current_balance)
-                time.sleep(1)  # To avoid hitting rate limits
+            # Fetch everything the session needs concurrently, paced by the shared Kraken rate limiter
+            with metrics.timed("fetch"):
+                closed_orders_future = session_pool.submit(metrics.timed_call, "closed_orders", "",
+                                                           get_closed_orders_by_pair, two_session_ago)
+                last_prices_future = session_pool.submit(metrics.timed_call, "last_prices", "",
+                                                         get_last_prices, [PAIRS[pair]["primary"] for pair in PAIRS.keys()])
+                atr_futures = {pair: session_pool.submit(metrics.timed_call, "atr", pair, get_current_atr, pair)
+                               for pair in PAIRS.keys()}
+                closed_orders = closed_orders_future.result()
+                last_prices = last_prices_future.result()
+                current_atrs = {pair: future.result() for pair, future in atr_futures.items()}
             
-            save_trailing_state(trailing_state)
-            runtime.update_trailing_state(trailing_state)
+            with _state_lock:
+                closes = run_session(closed_orders, last_prices, current_atrs, current_balance)
+            close_positions(closes)
 
             session_count += 1
+            session_duration = time.perf_counter() - session_started
+            if metrics.observe_session(session_duration, SLEEPING_INTERVAL):
+                logging.warning(f"Session took {session_duration:.1f}s, longer than SLEEPING_INTERVAL ({SLEEPING_INTERVAL}s).",
+                                event="session_overrun", duration=session_duration)
             logging.info(f"Session complete. Sleeping for {SLEEPING_INTERVAL}s.\n")
             time.sleep(SLEEPING_INTERVAL)
 
     except KeyboardInterrupt:
         logging.info("BoTC stopped manually by user.\n", to_telegram=True)
     finally:
+        session_pool.shutdown(wait=False, cancel_futures=True)
+        _close_pool.shutdown(wait=False)
+        atr_manager.stop_atr_min_worker()
+        metrics.stop_metrics_server()
+        price_stream.stop_price_stream()
         telegram.stop_telegram_thread()
 
+def reload_trailing_state():
+    global _trailing_state
+    with _state_lock:
+        _trailing_state = load_trailing_state()
+        _trigger_indexes.clear()
+        for pair, pair_state in _trailing_state.items():
+            trigger_index(pair).rebuild(pair_state)
+        _unpublished.clear()
+        _last_evaluated_price.clear()
+        runtime.update_trailing_state(_trailing_state)
+
+def trigger_index(pair):
+    return _trigger_indexes.setdefault(pair, TriggerIndex())
+
+def touch(op, pair, pair_state, order_id):
+    # Every position change goes through here: journaled for the next save and re-indexed for triggers
+    journal(op, pair, order_id)
+    trigger_index(pair).update(order_id, pair_state.get(order_id))
+    _unpublished.add((pair, order_id))
+
+def commit_trailing_state():
+    # Only positions marked dirty through touch() are written and republished
+    if save_trailing_state(_trailing_state):
+        runtime.update_trailing_state(_trailing_state, changed=_unpublished)
+        _unpublished.clear()
+
+def run_session(closed_orders, last_prices, current_atrs, current_balance):
+    # Returns the positions whose stop was hit, to be closed once the lock is released
+    trailing_state = _trailing_state
+    closes = []
+
+    for pair in PAIRS.keys():
+        current_price = last_prices.get(PAIRS[pair]["primary"])
+        current_atr = current_atrs.get(pair)
+
+        if current_price is None or current_atr is None:
+            logging.error(f"Could not fetch price or ATR for {pair}. Skipping this pair.\n")
+            continue
+        else:
+            logging.info(f"[{pair}] Market: {current_price:,.1f}€ | ATR: {current_atr:,.1f}€",
+                         event="market", pair=pair, price=current_price, atr=current_atr)
+            runtime.update_pair_data(pair, price=current_price, atr=current_atr)
+
+            atr_min_val = PAIRS[pair].get("atr_min", 0.0)
+            effective_atr = max(current_atr, atr_min_val)
+            if current_atr < atr_min_val:
+                logging.info(f"[{pair}] ATR ({current_atr:.4f}) < Min ({atr_min_val:.4f}). Using min.")
+            _effective_atr[pair] = effective_atr
+        
+        if pair not in trailing_state:
+            trailing_state[pair] = {}
+        pair_state = trailing_state[pair]
+        
+        with metrics.timed("process", pair):
+            for order_id, order in closed_orders.get(pair, {}).items():
+                if is_processed(order_id):
+                    continue
+                process_closed_order(order_id, order, pair_state, effective_atr, pair)
+                mark_processed(order_id, float(order.get("closetm", 0)))
+
+            closes += update_trailing_state(pair_state, pair, current_price, effective_atr, current_balance)
+            _last_evaluated_price[pair] = current_price
+    
+    with metrics.timed("commit"):
+        commit_trailing_state()
+    return closes
+
+def on_stream_price(pair, price):
+    runtime.update_pair_data(pair, price=price)
+    if telegram.BOT_PAUSED:
+        return
+
+    with _state_lock:
+        # Only thresholds between the last checked price and this one fire, so a price that stays
+        # past a stop is evaluated once instead of on every tick
+        previous = _last_evaluated_price.get(pair)
+        _last_evaluated_price[pair] = price
+        pair_state = _trailing_state.get(pair)
+        effective_atr = _effective_atr.get(pair)
+        if not pair_state or effective_atr is None:
+            return
+        crossed = [order_id for order_id in trigger_index(pair).crossed(price, previous) if (pair, order_id) not in _closing]
+        if not crossed:
+            return
+
+        logging.info(f"[{pair}] Stream price {price:,.1f}€ crossed a trailing threshold.", event="stream_cross", pair=pair, price=price)
+        closes = update_trailing_state(pair_state, pair, price, effective_atr, runtime.get_last_balance())
+        commit_trailing_state()
+    if closes:
+        _close_pool.submit(close_positions_safely, closes)
+
+def close_positions_safely(closes):
+    try:
+        close_positions(closes)
+    except Exception as e:
+        logging.error(f"Error closing positions {[order_id for _, order_id, _ in closes]}: {e}", to_telegram=True)
+
+def close_positions(closes):
+    # Closing orders are placed without holding _state_lock, so a slow Kraken call holds up neither the
+    # session loop nor the price stream. Until it returns, the position is in _closing and left untouched.
+    for pair, order_id, pos in closes:
+        side = pos.side
+        stop_price = pos.stop_price
+        logging.info(f"⛔[CLOSE] Stop price {stop_price:,}€ hit for position {order_id}: placing LIMIT {side.upper()} order",
+                     to_telegram=True, event="close", pair=pair, order_id=order_id, side=side, stop_price=stop_price)
+        try:
+            closing_order = place_limit_order(pair, side, stop_price, pos.volume)
+        except Exception as e:
+            logging.error(f"Error placing closing order for position {order_id}: {e}")
+            closing_order = None
+
+        with _state_lock:
+            _closing.discard((pair, order_id))
+            _blocked_notified.pop((pair, order_id), None)
+            if not closing_order:
+                logging.error(f"Failed to place closing order for position {order_id}. Aborting close.", to_telegram=True)
+                continue
+            logging.info(f"💸[PnL] Closed position: {pos.pnl:+.2f}% result", to_telegram=True,
+                         event="pnl", pair=pair, order_id=order_id, closing_order=closing_order, pnl=pos.pnl)
+
+            pos.closing_time = now_str()
+            save_closed_position(pos.to_dict(), closing_order, pair)
+            # The state may have been reloaded meanwhile: remove whatever is stored under this id now
+            pair_state = _trailing_state.get(pair, {})
+            if order_id in pair_state:
+                del pair_state[order_id]
+                touch("close", pair, pair_state, order_id)
+            commit_trailing_state()
+            logging.debug("Trailing position %s closed and removed.", order_id, pair=pair, order_id=order_id)
+
 def now_str():
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
 def get_reference_price(pos):
-    return pos.get("reference_price", pos["entry_price"])
+    return pos.reference
 
 def process_closed_order(order_id, order, pair_state, current_atr, pair):
-    logging.info(f"Processing order {order_id}...")
+    logging.debug("Processing order %s...", order_id, pair=pair, order_id=order_id)
     entry_price = float(order["price"])
     volume = float(order["vol_exec"])
     cost = float(order["cost"])
@@ -113,14 +277,13 @@ def process_closed_order(order_id, order, pair_state, current_atr, pair):
     elif MODE == "dualk":
         new_side, atr_value, activation_price = dualk_mode.process_order(side, entry_price, current_atr, pair)
 
+    # Range query on the reference price index; the first match in insertion order wins
     existing_position = None
-    for existing_id, pos in list(pair_state.items()):
-        if pos["mode"] != MODE or pos["side"] != new_side or pos.get("trailing_price") is not None:
-            continue
-        
-        reference_price = pos.get("reference_price", pos["entry_price"])
-        price_diff_pct = abs(reference_price - entry_price) / reference_price * 100        
-        if price_diff_pct < 0.5:  # 0.5% threshold to consider merging
+    for existing_id in trigger_index(pair).merge_candidates(MODE, new_side, entry_price, MERGE_THRESHOLD_PCT):
+        pos = pair_state[existing_id]
+        reference_price = pos.reference
+        price_diff_pct = abs(reference_price - entry_price) / reference_price * 100
+        if price_diff_pct < MERGE_THRESHOLD_PCT:
             existing_position = (existing_id, pos)
             break
     
@@ -128,45 +291,50 @@ def process_closed_order(order_id, order, pair_state, current_atr, pair):
         existing_id, existing_pos = existing_position
 
         if new_side == "sell":
-            new_volume = existing_pos["volume"] + volume
-            new_cost = new_volume * existing_pos["entry_price"]
+            new_volume = existing_pos.volume + volume
+            new_cost = new_volume * existing_pos.entry_price
         else:
-            new_cost = existing_pos["cost"] + cost
-            new_volume = new_cost / existing_pos["entry_price"]
+            new_cost = existing_pos.cost + cost
+            new_volume = new_cost / existing_pos.entry_price
         
-        existing_pos["volume"] = round(new_volume, 8)
-        existing_pos["cost"] = round(new_cost, 2)
-        existing_pos["opening_order"].append(order_id)
+        existing_pos.volume = round(new_volume, 8)
+        existing_pos.cost = round(new_cost, 2)
+        existing_pos.opening_order.append(order_id)
+        touch("merge", pair, pair_state, existing_id)
         
         logging.info(
             f"🔀[MERGE] Unified order {order_id} into existing position {existing_id}: "
-            f"activation at {pair_state[existing_id]['activation_price']:,}€",
-            to_telegram=True
+            f"activation at {pair_state[existing_id].activation_price:,}€",
+            to_telegram=True, event="merge", pair=pair, order_id=existing_id, merged_order=order_id,
+            entry_price=entry_price, activation_price=existing_pos.activation_price
         )
     else:
-        pair_state[order_id] = {
-            "side": new_side,
-            "mode": MODE,
-            "created_time": now_str(),
-            "opening_order": [order_id],
-            "entry_price": entry_price,
-            "volume": volume,
-            "cost": round(cost, 2),
-            "activation_atr": round(atr_value, 1),
-            "activation_price": round(activation_price, 1)
-        }
+        pair_state[order_id] = Position(
+            side=new_side,
+            mode=MODE,
+            created_time=now_str(),
+            opening_order=[order_id],
+            entry_price=entry_price,
+            volume=volume,
+            cost=round(cost, 2),
+            activation_atr=round(atr_value, 1),
+            activation_price=round(activation_price, 1)
+        )
+        touch("create", pair, pair_state, order_id)
         
         logging.info(
             f"🆕[CREATE] New trailing position {order_id} for {new_side.upper()} order: "
-            f"activation at {pair_state[order_id]['activation_price']:,}€",
-            to_telegram=True
+            f"activation at {pair_state[order_id].activation_price:,}€",
+            to_telegram=True, event="create", pair=pair, order_id=order_id, side=new_side,
+            entry_price=entry_price, activation_price=pair_state[order_id].activation_price
         )    
 
 def update_trailing_state(pair_state, pair, current_price, current_atr, current_balance):
-    logging.info(f"Checking trailing positions...")
+    # Returns (pair, order_id, position) for each stop hit; the caller closes them with close_positions
+    logging.debug("Checking trailing positions...", pair=pair)
 
     def calculate_activation_price(pos, atr_val):
-        side = pos["side"]
+        side = pos.side
         reference_price = get_reference_price(pos)
 
         if MODE == "onek":
@@ -176,13 +344,11 @@ def update_trailing_state(pair_state, pair, current_price, current_atr, current_
 
         activation_price = reference_price + activation_distance if side == "sell" else reference_price - activation_distance
 
-        pos.update({
-            "activation_price": round(activation_price, 1),
-            "activation_atr": round(atr_val, 1)
-        })
+        pos.activation_price = round(activation_price, 1)
+        pos.activation_atr = round(atr_val, 1)
 
     def calculate_stop_price(pos, atr_val, trailing_price):
-        side = pos["side"]
+        side = pos.side
         reference_price = get_reference_price(pos)
 
         if MODE == "onek":
@@ -191,20 +357,18 @@ def update_trailing_state(pair_state, pair, current_price, current_atr, current_
             stop_price = dualk_mode.calculate_stop_price(side, reference_price, trailing_price, atr_val, pair)
         
         # Calculate PnL and update cost/volume based on stop_price
-        entry_price = pos["entry_price"]
+        entry_price = pos.entry_price
         if side == "sell":
             pnl = (stop_price - entry_price) / entry_price * 100
-            pos["cost"] = round(pos["volume"] * stop_price, 2)
+            pos.cost = round(pos.volume * stop_price, 2)
         else:
             pnl = (entry_price - stop_price) / entry_price * 100
-            pos["volume"] = round(pos["cost"] / stop_price, 8)
+            pos.volume = round(pos.cost / stop_price, 8)
     
-        pos.update({
-            "trailing_price": trailing_price,
-            "stop_price": round(stop_price, 1),
-            "stop_atr": round(atr_val, 1),
-            "pnl": round(pnl, 2)
-        })
+        pos.trailing_price = trailing_price
+        pos.stop_price = round(stop_price, 1)
+        pos.stop_atr = round(atr_val, 1)
+        pos.pnl = round(pnl, 2)
         
     def check_recenter_activation(pos, atr_val, current_price):
         atr_threshold = float(RECENTER_PARAMS[pair]["ATR_MULT"]) * atr_val
@@ -212,7 +376,7 @@ def update_trailing_state(pair_state, pair, current_price, current_atr, current_
         max_threshold = max(atr_threshold, price_threshold)
 
         # If both RECENTER_PARAMS are set to 0, skip recentering
-        if max_threshold > 0 and abs(pos["activation_price"] - current_price) > max_threshold:
+        if max_threshold > 0 and abs(pos.activation_price - current_price) > max_threshold:
             return True
         return False
 
@@ -230,76 +394,84 @@ def update_trailing_state(pair_state, pair, current_price, current_atr, current_
         min_allocation = ASSET_MIN_ALLOCATION[pair]
         
         if asset_allocation_after < min_allocation:
+            now = time.monotonic()
+            notify = now - _blocked_notified.get((pair, order_id), -BLOCKED_NOTIFY_INTERVAL) >= BLOCKED_NOTIFY_INTERVAL
+            if notify:
+                _blocked_notified[(pair, order_id)] = now
             logging.warning(f"🛡️[BLOCKED] Sell {order_id} by inventory ratio: {asset_allocation_after:.2%} < min: {min_allocation:.0%}.",
-                            to_telegram=True)
+                            to_telegram=notify, event="blocked", pair=pair, order_id=order_id, allocation=asset_allocation_after)
             return False
         
         return True
 
-    def close_position(order_id, pos):
-        try:
-            side = pos["side"]
-            stop_price = pos["stop_price"]
-            pnl = pos["pnl"]
+    # The dualk ATR value only depends on the side
+    atr_by_side = {side: current_atr for side in ("sell", "buy")}
+    if MODE == "dualk":
+        atr_by_side = {side: dualk_mode.calculate_atr_value(side, current_price, current_atr, pair) for side in atr_by_side}
 
-            logging.info(f"⛔[CLOSE] Stop price {stop_price:,}€ hit for position {order_id}: placing LIMIT {side.upper()} order",
-                          to_telegram=True)
+    recenter_by_side = {side: max(float(RECENTER_PARAMS[pair]["ATR_MULT"]) * atr_val,
+                                  float(RECENTER_PARAMS[pair]["PRICE_PCT"]) * current_price)
+                        for side, atr_val in atr_by_side.items()}
 
-            closing_order = place_limit_order(pair, side, stop_price, pos["volume"])
-            if not closing_order:
-                logging.error(f"Failed to place closing order for position {order_id}. Aborting close.", to_telegram=True)
-                return
-            logging.info(f"💸[PnL] Closed position: {pnl:+.2f}% result", to_telegram=True)
-
-            pos["closing_time"] = now_str()
-            save_closed_position(pos, closing_order, pair)
-            del pair_state[order_id]
-            logging.info(f"Trailing position {order_id} closed and removed.")
-        except Exception as e:
-            logging.error(f"Failed to close trailing position {order_id}: {e}")
-
-    for order_id, pos in list(pair_state.items()):
-        side = pos["side"]
-        trailing_active = pos.get("trailing_price") is not None
-        atr_val = current_atr 
-        if MODE == "dualk":
-            atr_val = dualk_mode.calculate_atr_value(side, current_price, current_atr, pair)
+    # The trigger index narrows the book to positions near a threshold; the checks below keep the exact ones
+    closes = []
+    for order_id in trigger_index(pair).candidates(current_price, atr_by_side, recenter_by_side):
+        if (pair, order_id) in _closing:
+            continue
+        pos = pair_state[order_id]
+        side = pos.side
+        trailing_active = pos.trailing_active
+        atr_val = atr_by_side[side]
 
         if not trailing_active:
             if check_recenter_activation(pos, atr_val, current_price):
-                pos["reference_price"] = current_price
+                pos.reference_price = current_price
                 calculate_activation_price(pos, atr_val)
-                logging.info(f"🔄[RECENTER] Position {order_id}: recentered activation price to {pos['activation_price']:,}€.")
+                logging.info("🔄[RECENTER] Position %s: recentered activation price to %s€.", order_id, logging.Thousands(pos.activation_price),
+                             event="recenter", pair=pair, order_id=order_id, price=current_price, activation_price=pos.activation_price)
+                touch("recenter", pair, pair_state, order_id)
 
-            if pos["activation_atr"] * 0.8 > atr_val or atr_val > pos["activation_atr"] * 1.2:
+            if pos.activation_atr * 0.8 > atr_val or atr_val > pos.activation_atr * 1.2:
                 calculate_activation_price(pos, atr_val)
-                logging.info(f"♻️[ATR] Position {order_id}: recalibrate activation price to {pos['activation_price']:,}€.")
-
-            if (side == "sell" and current_price >= pos["activation_price"]) or \
-               (side == "buy" and current_price <= pos["activation_price"]):
-                logging.info(f"⚡[ACTIVE] Activation price {pos['activation_price']:,}€ reached for position {order_id}", to_telegram=True)
-                pos.update({
-                    "stop_atr": pos["activation_atr"],
-                    "activation_time": now_str()
-                })
+                logging.info("♻️[ATR] Position %s: recalibrate activation price to %s€.", order_id, logging.Thousands(pos.activation_price),
+                             event="atr", pair=pair, order_id=order_id, atr=atr_val, activation_price=pos.activation_price)
+                touch("atr", pair, pair_state, order_id)
+
+            if (side == "sell" and current_price >= pos.activation_price) or \
+               (side == "buy" and current_price <= pos.activation_price):
+                logging.info(f"⚡[ACTIVE] Activation price {pos.activation_price:,}€ reached for position {order_id}", to_telegram=True,
+                             event="activate", pair=pair, order_id=order_id, price=current_price, activation_price=pos.activation_price)
+                pos.stop_atr = pos.activation_atr
+                pos.activation_time = now_str()
                 calculate_stop_price(pos, atr_val, current_price)
-                logging.info(f"📈[TRAIL] Position {order_id}: New price {pos['trailing_price']:,}€ | Stop {pos['stop_price']:,}€")
+                logging.info("📈[TRAIL] Position %s: New price %s€ | Stop %s€", order_id,
+                             logging.Thousands(pos.trailing_price), logging.Thousands(pos.stop_price),
+                             event="trail", pair=pair, order_id=order_id, trailing_price=pos.trailing_price, stop_price=pos.stop_price)
+                touch("activate", pair, pair_state, order_id)
 
         else:
-            if (pos["stop_atr"] * 0.8 > atr_val or atr_val > pos["stop_atr"] * 1.2):
-                calculate_stop_price(pos, atr_val, pos["trailing_price"])
-                logging.info(f"♻️[ATR] Position {order_id}: recalibrate stop price to {pos['stop_price']:,}€.")
-
-            if (side == "sell" and current_price <= pos["stop_price"] and can_execute_sell(order_id, pos["volume"], current_balance, current_price)) or \
-               (side == "buy" and current_price >= pos["stop_price"]):
-                close_position(order_id, pos)
+            if (pos.stop_atr * 0.8 > atr_val or atr_val > pos.stop_atr * 1.2):
+                calculate_stop_price(pos, atr_val, pos.trailing_price)
+                logging.info("♻️[ATR] Position %s: recalibrate stop price to %s€.", order_id, logging.Thousands(pos.stop_price),
+                             event="atr", pair=pair, order_id=order_id, atr=atr_val, stop_price=pos.stop_price)
+                touch("atr", pair, pair_state, order_id)
+
+            if (side == "sell" and current_price <= pos.stop_price and can_execute_sell(order_id, pos.volume, current_balance, current_price)) or \
+               (side == "buy" and current_price >= pos.stop_price):
+                # The closing order itself is placed by close_positions, outside the state lock
+                _closing.add((pair, order_id))
+                closes.append((pair, order_id, pos))
                 continue 
 
-            if (side == "sell" and current_price > pos["trailing_price"]) or \
-               (side == "buy" and current_price < pos["trailing_price"]):
+            if (side == "sell" and current_price > pos.trailing_price) or \
+               (side == "buy" and current_price < pos.trailing_price):
                 calculate_stop_price(pos, atr_val, current_price)
-                logging.info(f"📈[TRAIL] Position {order_id}: New price {pos['trailing_price']:,}€ | Stop {pos['stop_price']:,}€")
-                
-    
+                logging.info("📈[TRAIL] Position %s: New price %s€ | Stop %s€", order_id,
+                             logging.Thousands(pos.trailing_price), logging.Thousands(pos.stop_price),
+                             event="trail", pair=pair, order_id=order_id, trailing_price=pos.trailing_price, stop_price=pos.stop_price)
+                touch("trail", pair, pair_state, order_id)
+
+    return closes
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,106 @@
+import threading, logging, asyncio, json
+
+from websockets.asyncio.client import connect
+from websockets.client import backoff
+from websockets.exceptions import ConnectionClosed
+
+from core.config import PRICE_STREAM_URL
+
+class PriceStream:
+    def __init__(self, url, pairs_map, on_price):
+        self.url = url
+        self.on_price = on_price
+        # Kraken WebSocket names ("XBT/EUR") back to configured pair names ("XBTEUR")
+        self.pairs_by_wsname = {info["wsname"]: pair for pair, info in pairs_map.items() if info.get("wsname")}
+        self._loop = None
+        self._task = None
+
+    def _subscription(self):
+        return json.dumps({
+            "event": "subscribe",
+            "pair": list(self.pairs_by_wsname.keys()),
+            "subscription": {"name": "ticker"}
+        })
+
+    def _handle_message(self, message):
+        data = json.loads(message)
+
+        # Events (heartbeat, systemStatus, subscriptionStatus) are dicts; channel data are lists:
+        # [channelID, {"c": [last price, volume], ...}, "ticker", wsname]
+        if not isinstance(data, list) or len(data) < 4 or data[2] != "ticker":
+            if isinstance(data, dict) and data.get("status") == "error":
+                logging.error(f"Price stream subscription error: {data.get('errorMessage')}")
+            return
+
+        pair = self.pairs_by_wsname.get(data[3])
+        if pair is None:
+            return
+        try:
+            self.on_price(pair, float(data[1]["c"][0]))
+        except Exception as e:
+            logging.error(f"Price stream handler error for {pair}: {e}")
+
+    async def _stream(self):
+        # connect() used as an async iterator reconnects with exponential backoff when connecting fails;
+        # any other error on an open connection is logged and retried with the same backoff
+        delays = None
+        async for ws in connect(self.url, ping_interval=20):
+            try:
+                await ws.send(self._subscription())
+                logging.info(f"Price stream connected: {len(self.pairs_by_wsname)} pairs subscribed.")
+                async for message in ws:
+                    delays = None
+                    try:
+                        self._handle_message(message)
+                    except Exception as e:
+                        # A bad message or handler failure skips that message, the connection stays up
+                        logging.error(f"Price stream message error: {e}")
+            except ConnectionClosed as e:
+                logging.warning(f"Price stream disconnected ({e}). Reconnecting...")
+            except Exception as e:
+                delays = delays or backoff()
+                delay = next(delays)
+                logging.error(f"Price stream error ({e}). Reconnecting in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+
+        try:
+            self._task = loop.create_task(self._stream())
+            loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"Price stream thread error: {e}")
+        finally:
+            # Let the connection's keepalive and close handshake unwind before closing the loop
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+            self._loop = None
+            logging.info("Price stream thread has exited.")
+
+    def stop(self):
+        if self._loop and self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+price_stream = None
+
+def initialize_price_stream(pairs_map, on_price):
+    global price_stream
+    price_stream = PriceStream(PRICE_STREAM_URL, pairs_map, on_price)
+    t = threading.Thread(target=price_stream.run, daemon=True)
+    t.start()
+
+def stop_price_stream():
+    try:
+        if price_stream:
+            price_stream.stop()
+            logging.info("Price stream stopped.")
+    except Exception as e:
+        logging.error(f"Error stopping price stream: {e}")
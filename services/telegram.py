@@ -1,12 +1,22 @@
-import threading, time, logging, asyncio, json, requests
+import threading, time, logging, asyncio, json, queue
 
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler
 
-from core.config import TELEGRAM_TOKEN, ALLOWED_USER_ID, POLL_INTERVAL_SEC, MODE, PAIRS
+from core.config import TELEGRAM_TOKEN, ALLOWED_USER_ID, POLL_INTERVAL_SEC, NOTIFY_QUEUE_SIZE, NOTIFY_INTERVAL_SEC, MODE, PAIRS
+import core.metrics as metrics
 from core.runtime import get_last_balance, get_pair_data, get_trailing_state
+from exchange.kraken import get_last_prices
 
 BOT_PAUSED = False
+RELOAD_REQUESTED = False
+
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit per message
+
+# Notifications from any thread are queued and sent from the bot's event loop, so logging never waits on Telegram
+_notifications = queue.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+_dropped_lock = threading.Lock()
+_dropped = 0
 
 # Only log warnings and above from telegram library
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -19,8 +29,9 @@ class TelegramInterface:
     def __init__(self, token, user_id):
         self.token = token
         self.user_id = user_id
-        self.app = ApplicationBuilder().token(token).build()
+        self.app = ApplicationBuilder().token(token).post_init(self._start_notifier).build()
         self._loop = None
+        self._notifier = None
     
     def _check_auth(self, update: Update) -> bool:
         return update.effective_user.id == self.user_id
@@ -44,6 +55,8 @@ class TelegramInterface:
             "/resume - Resume bot operations\n"
             "/market [pair] - Current market data (all or specific pair)\n"
             "/positions [pair] - Open positions (all or specific pair)\n"
+            "/reload - Reload trailing state from disk (edit it while paused)\n"
+            "/perf - Session timings and Kraken API latency\n"
             "/help - Show this help\n\n"
             f"Configured pairs: {pairs_list}\n"
             "Example: /market XBTEUR"
@@ -78,6 +91,12 @@ class TelegramInterface:
         BOT_PAUSED = False
         await update.message.reply_text("▶️ BoTC resumed.")
 
+    async def reload_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self._check_auth(update): return
+        global RELOAD_REQUESTED
+        RELOAD_REQUESTED = True
+        await update.message.reply_text("🔁 Trailing state will be reloaded from disk before the next session.")
+
     async def market_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not self._check_auth(update): return
         try:
@@ -89,14 +108,18 @@ class TelegramInterface:
             
             balance = get_last_balance()
             pairs_to_show = [pair_filter] if pair_filter else list(PAIRS.keys())
+
+            # One Ticker request for the whole snapshot, off the bot's event loop
+            last_prices = await asyncio.to_thread(get_last_prices, [PAIRS[pair]['primary'] for pair in pairs_to_show])
             
             msg = "📈 Market Status:\n\n"
             
             for pair in pairs_to_show:
                 try:
                     pair_data = get_pair_data(pair)
-                    price = pair_data.get('last_price')
+                    price = last_prices.get(PAIRS[pair]['primary'], pair_data.get('last_price'))
                     atr = pair_data.get('atr')
+                    atr_min = pair_data.get('atr_min')
 
                     asset = PAIRS[pair].get('base')
                     asset_balance = float(balance.get(asset, 0))
@@ -106,10 +129,13 @@ class TelegramInterface:
                         f"━━━ {pair} ━━━\n"
                         f"Price: {price:,.2f}€\n"
                         f"ATR(15m): {atr:,.2f}€\n"
+                    )
+                    if atr_min is not None:
+                        computed = time.strftime("%H:%M", time.localtime(pair_data['atr_min_time']))
+                        msg += f"ATR min: {atr_min:,.2f}€ ({computed}, {pair_data['atr_min_duration']:.1f}s)\n"
+                    msg += (
                         f"Balance: {asset_balance:.8f} ({asset_value_eur:,.2f}€)\n\n"
                     )
-                    if len(pairs_to_show) > 1:
-                        await asyncio.sleep(1)  # Delay to avoid rate limits
                 except Exception as e:
                     msg += f"━━━ {pair} ━━━\n❌ Error: {e}\n\n"
             
@@ -191,21 +217,40 @@ class TelegramInterface:
             logging.error(f"Error in positions_command: {e}")
             await update.message.reply_text(f"❌ Error fetching positions: {e}")
 
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self._check_auth(update): return
+        try:
+            # One line per stage, pair and API method: long setups go over Telegram's message limit
+            for chunk in split_message("⏱ Performance:\n\n" + metrics.summary()):
+                await update.message.reply_text(chunk)
+        except Exception as e:
+            logging.error(f"Error in perf_command: {e}")
+            await update.message.reply_text(f"❌ Error fetching performance data: {e}")
+
     async def send_message_async(self, message):
         try:
             await self.app.bot.send_message(chat_id=self.user_id, text=message)
         except Exception as e:
             logging.error(f"Telegram async send error: {e}")
 
-    def send_message(self, message):
-        try:
-            if self._loop and self._loop.is_running():
-                asyncio.run_coroutine_threadsafe(self.send_message_async(message), self._loop)
-            else:                
-                url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-                requests.post(url, json={"chat_id": self.user_id, "text": message}, timeout=10)
-        except Exception as e:
-            logging.error(f"Telegram send error: {e}")
+    async def _start_notifier(self, app):
+        # Plain loop task: tasks from app.create_task are awaited by app.stop() and this one never ends
+        self._notifier = asyncio.get_running_loop().create_task(self._drain_notifications())
+
+    async def _drain_notifications(self):
+        # Everything queued since the last send goes out as one message, at most one every NOTIFY_INTERVAL_SEC
+        while True:
+            await asyncio.sleep(NOTIFY_INTERVAL_SEC)
+            for chunk in split_message(take_notifications()):
+                await self.send_message_async(chunk)
+                await asyncio.sleep(NOTIFY_INTERVAL_SEC)
+
+    async def flush_notifications(self):
+        if self._notifier:
+            self._notifier.cancel()
+            self._notifier = None
+        for chunk in split_message(take_notifications()):
+            await self.send_message_async(chunk)
 
     def run(self):
         # New event loop for this secondary thread
@@ -220,6 +265,8 @@ class TelegramInterface:
             self.app.add_handler(CommandHandler("resume", self.resume_command))
             self.app.add_handler(CommandHandler("market", self.market_command))
             self.app.add_handler(CommandHandler("positions", self.positions_command))
+            self.app.add_handler(CommandHandler("reload", self.reload_command))
+            self.app.add_handler(CommandHandler("perf", self.perf_command))
 
             loop.run_until_complete(self.send_startup_message())
 
@@ -248,14 +295,51 @@ def initialize_telegram():
     t.start()
     
 def send_notification(msg):
+    global _dropped
     if tg_interface is None:
         logging.warning("Telegram not initialized. Message not sent: " + msg)
         return
-    tg_interface.send_message(msg)
+    try:
+        _notifications.put_nowait(msg)
+    except queue.Full:
+        with _dropped_lock:
+            _dropped += 1
+
+def take_notifications():
+    # Drains the queue into one text, noting how many notifications were dropped while it was full
+    global _dropped
+    messages = []
+    while True:
+        try:
+            messages.append(_notifications.get_nowait())
+        except queue.Empty:
+            break
+    with _dropped_lock:
+        dropped, _dropped = _dropped, 0
+    if dropped:
+        messages.append(f"⚠️ {dropped} notifications dropped (queue full)")
+    return "\n".join(messages)
+
+def split_message(text, limit=MAX_MESSAGE_LENGTH):
+    # Splits at line breaks where possible
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        chunks.append(text)
+    return chunks
 
 def stop_telegram_thread():
     try:
         if tg_interface and tg_interface.app and tg_interface._loop and tg_interface._loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(tg_interface.flush_notifications(), tg_interface._loop).result(timeout=5)
+            except Exception as e:
+                logging.warning(f"Timeout/err flushing Telegram notifications: {e}")
             future = asyncio.run_coroutine_threadsafe(tg_interface.app.stop(), tg_interface._loop)
             try:
                 future.result(timeout=5) # Wait for stop to complete
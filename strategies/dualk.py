@@ -1,6 +1,8 @@
 from core.config import TRADING_PARAMS as PARAMS
 
-def process_order(side, entry_price, current_atr, pair):
+# params: {"sell": {...}, "buy": {...}} overriding the configured TRADING_PARAMS[pair] (backtests, optimizer)
+
+def process_order(side, entry_price, current_atr, pair, params=None):
     if side == "buy":
         new_side = "sell"
         sign = 1
@@ -8,13 +10,13 @@ def process_order(side, entry_price, current_atr, pair):
         new_side = "buy"
         sign = -1
 
-    atr_value = calculate_atr_value(new_side, entry_price, current_atr, pair)
-    activation_distance = calculate_activation_dist(new_side, atr_value, pair)
+    atr_value = calculate_atr_value(new_side, entry_price, current_atr, pair, params)
+    activation_distance = calculate_activation_dist(new_side, atr_value, pair, params)
     activation_price = entry_price + sign * activation_distance
     return new_side, atr_value, activation_price
 
-def calculate_atr_value(side, price, current_atr, pair):
-    atr_min = PARAMS[pair][side]["ATR_MIN"]
+def calculate_atr_value(side, price, current_atr, pair, params=None):
+    atr_min = (params or PARAMS[pair])[side]["ATR_MIN"]
 
     if current_atr is None:
         # ATR data unavailable, use minimum threshold
@@ -29,13 +31,14 @@ def calculate_atr_value(side, price, current_atr, pair):
 
     return atr_value
 
-def calculate_activation_dist(side, atr_value, pair):
-    activation_distance = PARAMS[pair][side]["K_ACT"] * atr_value
+def calculate_activation_dist(side, atr_value, pair, params=None):
+    activation_distance = (params or PARAMS[pair])[side]["K_ACT"] * atr_value
     return activation_distance
 
-def calculate_stop_price(side, entry_price, trailing_ref_price, atr_val, pair):
-    raw_stop = PARAMS[pair][side]["K_STOP"] * atr_val
-    min_margin_eur = entry_price * PARAMS[pair][side]["MIN_MARGIN"]
+def calculate_stop_price(side, entry_price, trailing_ref_price, atr_val, pair, params=None):
+    side_params = (params or PARAMS[pair])[side]
+    raw_stop = side_params["K_STOP"] * atr_val
+    min_margin_eur = entry_price * side_params["MIN_MARGIN"]
     
     if side == "sell":
         max_space = (trailing_ref_price - entry_price) - min_margin_eur
@@ -1,6 +1,8 @@
 from core.config import TRADING_PARAMS as PARAMS
 
-def process_order(side, entry_price, current_atr, pair):
+# params: {"sell": {...}, "buy": {...}} overriding the configured TRADING_PARAMS[pair] (backtests, optimizer)
+
+def process_order(side, entry_price, current_atr, pair, params=None):
     if side == "buy":
         new_side = "sell"
         sign = 1
@@ -8,18 +10,19 @@ def process_order(side, entry_price, current_atr, pair):
         new_side = "buy"
         sign = -1
 
-    activation_distance = calculate_activation_dist(new_side, current_atr, entry_price, pair)
+    activation_distance = calculate_activation_dist(new_side, current_atr, entry_price, pair, params)
     activation_price = entry_price + sign * activation_distance
     return new_side, current_atr, activation_price
 
-def calculate_activation_dist(side, atr_val, entry_price, pair):
-    k_stop = PARAMS[pair][side]["K_STOP"]
-    min_margin = PARAMS[pair][side]["MIN_MARGIN"]
+def calculate_activation_dist(side, atr_val, entry_price, pair, params=None):
+    side_params = (params or PARAMS[pair])[side]
+    k_stop = side_params["K_STOP"]
+    min_margin = side_params["MIN_MARGIN"]
     activation_distance = k_stop * atr_val + min_margin * entry_price
     return activation_distance
 
-def calculate_stop_price(side, trailing_ref_price, atr_val, pair):
-    stop_distance = PARAMS[pair][side]["K_STOP"] * atr_val
+def calculate_stop_price(side, trailing_ref_price, atr_val, pair, params=None):
+    stop_distance = (params or PARAMS[pair])[side]["K_STOP"] * atr_val
 
     if side == "sell":
         stop_price = trailing_ref_price - stop_distance
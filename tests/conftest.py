@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# core.config reads the environment at import and core.state/core.logging write under ./data and ./logs:
+# configure a one-pair onek bot and run from a scratch directory before any test imports the bot
+os.environ.update({
+    "MODE": "onek",
+    "PAIRS": "XBTEUR",
+    "SELL_K_STOP": "1",
+    "SELL_MIN_MARGIN": "0.01",
+    "BUY_K_STOP": "1",
+    "BUY_MIN_MARGIN": "0.01",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="botc-tests-"))
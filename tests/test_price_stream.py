@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+from websockets.asyncio.server import serve
+
+import main
+import core.runtime as runtime
+import services.telegram as telegram
+from core.config import PAIRS
+from core.position import Position
+from services.price_stream import PriceStream
+
+TICKS_FILE = os.path.join(os.path.dirname(__file__), "data", "kraken_ticker_xbteur.jsonl")
+
+class ReplayServer:
+    # Local stand-in for Kraken's WebSocket: waits for the subscription, then replays recorded messages
+    def __init__(self, messages):
+        self.messages = messages
+        self.subscription = None
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = None
+        self._stop = None
+
+    async def _handler(self, ws):
+        self.subscription = await ws.recv()
+        for message in self.messages:
+            await ws.send(message)
+        await ws.wait_closed()
+
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        async with serve(self._handler, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),), daemon=True).start()
+        assert self._ready.wait(5)
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def ticker(price):
+    return json.dumps([336, {"c": [f"{price:.5f}", "0.01000000"]}, "ticker", "XBT/EUR"])
+
+@pytest.fixture
+def book():
+    # Loads positions into the bot's XBTEUR book, with a clean stream and notification history
+    PAIRS["XBTEUR"].update(primary="XXBTZEUR", wsname="XBT/EUR", base="XXBT", quote="ZEUR")
+    main._trailing_state.clear()
+    main._last_evaluated_price.clear()
+    main._blocked_notified.clear()
+    main._closing.clear()
+    main._effective_atr["XBTEUR"] = 100.0
+
+    def load(positions):
+        main._trailing_state["XBTEUR"] = positions
+        main.trigger_index("XBTEUR").rebuild(positions)
+    return load
+
+def test_replayed_ticks_activate_trail_and_stop(monkeypatch, book):
+    # Sell position from a 50,000€ buy with ATR 100: activation at 50,000 + 1 * 100 + 1% = 50,600€
+    pos = Position(side="sell", mode="onek", entry_price=50000.0, volume=0.01, cost=500.0,
+                   activation_atr=100.0, activation_price=50600.0, opening_order=["OBUY-1"])
+    book({"OBUY-1": pos})
+
+    ops = []
+    touch = main.touch
+    monkeypatch.setattr(main, "touch", lambda op, *args: (ops.append(op), touch(op, *args)))
+
+    orders = []
+    def place_limit_order(pair, side, price, volume):
+        # The order goes out while the state stays available to the session loop
+        assert not main._state_lock.locked()
+        orders.append((pair, side, price, volume))
+        return "OCLOSE-1"
+    monkeypatch.setattr(main, "place_limit_order", place_limit_order)
+
+    with open(TICKS_FILE) as f:
+        server = ReplayServer([line.strip() for line in f if line.strip()])
+    server.start()
+    stream = PriceStream(f"ws://127.0.0.1:{server.port}", PAIRS, main.on_stream_price)
+    threading.Thread(target=stream.run, daemon=True).start()
+    try:
+        assert wait_until(lambda: "close" in ops)
+    finally:
+        stream.stop()
+        server.stop()
+
+    assert '"XBT/EUR"' in server.subscription
+    # 50,700 activates (stop 50,600), 50,900 trails (stop 50,800), 50,850 changes nothing, 50,750 hits the stop
+    assert ops == ["activate", "trail", "close"]
+    assert orders == [("XBTEUR", "sell", 50800.0, 0.01)]
+    assert "OBUY-1" not in main._trailing_state["XBTEUR"]
+    assert not main._closing
+    assert pos.pnl == 1.6 and pos.closing_time
+
+def test_price_past_blocked_stop_is_evaluated_once(monkeypatch, book):
+    # Trailing sell whose stop is hit while the inventory ratio blocks the sale
+    pos = Position(side="sell", mode="onek", entry_price=50000.0, volume=0.01, cost=508.0, activation_atr=100.0,
+                   activation_price=50600.0, stop_atr=100.0, trailing_price=51000.0, stop_price=50800.0,
+                   opening_order=["OBUY-2"])
+    book({"OBUY-2": pos})
+    monkeypatch.setitem(main.ASSET_MIN_ALLOCATION, "XBTEUR", 0.5)
+    runtime.update_balance({"XXBT": "0.01", "ZEUR": "1000"})
+
+    evaluations = []
+    update_trailing_state = main.update_trailing_state
+    monkeypatch.setattr(main, "update_trailing_state", lambda *args: (evaluations.append(args[2]), update_trailing_state(*args))[1])
+    notifications = []
+    monkeypatch.setattr(telegram, "send_notification", notifications.append)
+    monkeypatch.setattr(main, "place_limit_order", lambda *args: pytest.fail("blocked sell was placed"))
+
+    prices = [51000.0, 50750.0, 50700.0, 50650.0, 50600.0, 50550.0]
+    handled = []
+    def on_price(pair, price):
+        main.on_stream_price(pair, price)
+        handled.append(price)
+
+    server = ReplayServer([ticker(price) for price in prices])
+    server.start()
+    stream = PriceStream(f"ws://127.0.0.1:{server.port}", PAIRS, on_price)
+    threading.Thread(target=stream.run, daemon=True).start()
+    try:
+        assert wait_until(lambda: len(handled) == len(prices))
+    finally:
+        stream.stop()
+        server.stop()
+
+    # 51,000 crosses nothing, 50,750 crosses the stop, the lower ticks stay past it without crossing again
+    assert evaluations == [50750.0]
+    assert len([text for text in notifications if "[BLOCKED]" in text]) == 1
+    assert "OBUY-2" in main._trailing_state["XBTEUR"] and not main._closing
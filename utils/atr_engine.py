@@ -0,0 +1,69 @@
+import math
+from collections import deque
+
+class AtrEngine:
+    # Keeps the last close and the rolling TR window of a pair so every closed candle
+    # is folded in O(1). The rolling sum mirrors pandas' rolling().mean() accumulator
+    # (Kahan-compensated add/remove), so the output is bit-identical to
+    # df["TR"].rolling(period).mean() over the same series of candles.
+    def __init__(self, period):
+        self.period = period
+        self.last_time = None
+        self.last_close = None
+        self._window = deque()
+        self._sum = 0.0
+        self._comp_add = 0.0
+        self._comp_remove = 0.0
+        self._same_count = 0
+        self._prev_tr = None
+
+    def true_range(self, high, low):
+        if self.last_close is None:
+            return high - low
+        return max(high - low, abs(high - self.last_close), abs(low - self.last_close))
+
+    def fold(self, time, high, low, close):
+        tr = self.true_range(high, low)
+        self._push(tr)
+        self.last_time = time
+        self.last_close = close
+        return tr, self.atr()
+
+    def atr(self):
+        n = len(self._window)
+        if n < self.period:
+            return math.nan
+        if self._same_count >= n:
+            return self._prev_tr
+        result = self._sum / n
+        return 0.0 if result < 0 else result
+
+    def peek(self, high, low):
+        # ATR including the still-open candle, without committing it to the window
+        preview = AtrEngine(self.period)
+        preview.last_close = self.last_close
+        preview._window = deque(self._window)
+        preview._sum = self._sum
+        preview._comp_add = self._comp_add
+        preview._comp_remove = self._comp_remove
+        preview._same_count = self._same_count
+        preview._prev_tr = self._prev_tr
+        preview._push(preview.true_range(high, low))
+        return preview.atr()
+
+    def _push(self, tr):
+        if len(self._window) == self.period:
+            old = self._window.popleft()
+            y = -old - self._comp_remove
+            t = self._sum + y
+            self._comp_remove = t - self._sum - y
+            self._sum = t
+
+        y = tr - self._comp_add
+        t = self._sum + y
+        self._comp_add = t - self._sum - y
+        self._sum = t
+
+        self._same_count = self._same_count + 1 if tr == self._prev_tr else 1
+        self._prev_tr = tr
+        self._window.append(tr)
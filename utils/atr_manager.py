@@ -1,12 +1,101 @@
+import time
 import numpy as np
 import logging
-from utils.market_noise_analyzer import load_data, detect_pivots, calculate_noise_between_pivots, DEFAULT_ORDER
-from core.config import ATR_MIN_PERCENTILE
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import core.runtime as runtime
+import core.metrics as metrics
+from utils.market_noise_analyzer import (load_data, find_extrema, filter_pivots, take_pivots, concat_pivots, empty_pivots,
+                                         calculate_noise_events, DEFAULT_ORDER)
+from core.config import ATR_MIN_PERCENTILE, PAIRS
 
 # ATR minimum coefficient range
 ATR_MIN_COEFF_MIN = 0.7
 ATR_MIN_COEFF_MAX = 0.9
 
+# Per pair pivots and noise events that later candles can no longer change:
+#   confirmed: filtered pivots followed by at least one more filtered pivot
+#   events: noise events between consecutive confirmed pivots
+#   top: last filtered pivot, still replaceable by a more extreme one of the same type
+#   closed_until: last candle whose extrema are final (followed by `order` candles)
+#   first_dtime: first candle of the window, to detect a trim
+#   last_dtime: last candle seen, to detect a rewritten history
+_noise_cache = {}
+
+def _contains(dtimes, dtime):
+    i = np.searchsorted(dtimes, dtime)
+    return i < len(dtimes) and dtimes[i] == dtime
+
+def _reindex(pivots, dtimes):
+    return pivots._replace(index=np.searchsorted(dtimes, pivots.dtime))
+
+def _redetect_front(df, confirmed, events, order):
+    # A full detection sees the window's first `order` candles with clipped left context, which can add
+    # extrema there and change the first pivot runs. Runs are the same from the second confirmed pivot
+    # past that edge on, so only the pivots up to it are detected again. None if there is no such pivot.
+    past_edge = np.flatnonzero(confirmed.index >= order)
+    if len(past_edge) < 2:
+        return None
+    settled = past_edge[1]
+    end = confirmed.index[settled]
+    extrema = find_extrema(df.iloc[:end + order + 1], order)
+    front = filter_pivots(take_pivots(extrema, extrema.index <= end))
+    events = calculate_noise_events(df, front) + [event for event in events if event['start_dtime'] >= confirmed.dtime[settled]]
+    return concat_pivots(front, take_pivots(confirmed, slice(settled + 1, None))), events
+
+def update_noise_events(pair, df, order=DEFAULT_ORDER):
+    # Noise events of the whole frame, only detecting pivots on candles past the cached ones
+    dtimes = df['dtime'].values
+    n = len(df)
+    cache = _noise_cache.get(pair)
+
+    # Trimmed history retires the pivots and events that left the window
+    if cache and n and _contains(dtimes, cache['last_dtime']) and \
+            (cache['closed_until'] is None or cache['closed_until'] >= dtimes[0]) and \
+            (len(cache['top'].dtime) == 0 or cache['top'].dtime[0] >= dtimes[0]):
+        confirmed = _reindex(take_pivots(cache['confirmed'], cache['confirmed'].dtime >= dtimes[0]), dtimes)
+        events = [event for event in cache['events'] if event['start_dtime'] >= dtimes[0]]
+        top = _reindex(cache['top'], dtimes)
+        start = 0 if cache['closed_until'] is None else int(np.searchsorted(dtimes, cache['closed_until'], side='right'))
+        # Trimmed history also moves the clipped edge: the front is detected again to match a full pass
+        if dtimes[0] != cache['first_dtime']:
+            front = _redetect_front(df, confirmed, events, order)
+            if front is None:
+                cache = None
+            else:
+                confirmed, events = front
+    else:
+        cache = None
+    if cache is None:
+        confirmed, events, top, start = empty_pivots(), [], empty_pivots(), 0
+
+    # Extrema of the last `order` candles can still change: they are left out of the cache
+    boundary = max(start, n - order)
+    extrema = find_extrema(df, order, start)
+    closed = extrema.index < boundary
+    final = filter_pivots(concat_pivots(top, take_pivots(extrema, closed)))
+
+    # Everything but the new top is confirmed, including the event from the last cached pivot into it
+    new_confirmed = take_pivots(final, slice(None, -1))
+    events = events + calculate_noise_events(df, concat_pivots(take_pivots(confirmed, slice(-1, None)), new_confirmed))
+    confirmed = concat_pivots(confirmed, new_confirmed)
+    top = take_pivots(final, slice(-1, None))
+
+    if n:
+        _noise_cache[pair] = {
+            'confirmed': confirmed,
+            'events': events,
+            'top': top,
+            'closed_until': dtimes[boundary - 1] if boundary else None,
+            'first_dtime': dtimes[0],
+            'last_dtime': dtimes[-1]
+        }
+
+    # Tentative tail: the top plus the open extrema, as a full detection would see them now
+    tail = filter_pivots(concat_pivots(top, take_pivots(extrema, ~closed)))
+    return events + calculate_noise_events(df, concat_pivots(take_pivots(confirmed, slice(-1, None)), tail))
+
 def calculate_atr_min(pair):
     try:
         df = load_data(pair)
@@ -19,12 +108,9 @@ def calculate_atr_min(pair):
         logging.error(f"Invalid ATR median for {pair}: {atr_median}")
         return 0
 
-    pivots = detect_pivots(df, DEFAULT_ORDER)
-    
     ratios = []
-    for i in range(1, len(pivots)):
-        event = calculate_noise_between_pivots(df, (pivots[i-1], pivots[i]))
-        if event and event.get('atr_at_max'):
+    for event in update_noise_events(pair, df):
+        if event.get('atr_at_max'):
             ratio = event['atr_at_max'] / atr_median
             ratios.append(ratio)
             
@@ -40,4 +126,61 @@ def calculate_atr_min(pair):
     atr_min = min_coeff * atr_median
     logging.info(f"[{pair}] ATR Min Calculation: Median={atr_median:.4f}, Coeff={min_coeff:.4f}, Min={atr_min:.4f}")
     
-    return atr_min
\ No newline at end of file
+    return atr_min
+
+# Background refresh: one long-lived worker process, so the noise cache above stays warm between runs
+_refresh_pool = None
+_refresh_futures = {}
+
+def _timed_atr_min(pair):
+    started = time.perf_counter()
+    atr_min = calculate_atr_min(pair)
+    return atr_min, time.perf_counter() - started
+
+def _publish_atr_min(pair, future):
+    if future.cancelled():
+        return
+    try:
+        atr_min, duration = future.result()
+    except Exception as e:
+        logging.error(f"[{pair}] ATR Min calculation failed, keeping previous value: {e}")
+        return
+
+    # A single item assignment: sessions read either the previous or the new value, never a partial one
+    PAIRS[pair]["atr_min"] = atr_min
+    runtime.update_atr_min(pair, atr_min, time.time(), duration)
+    metrics.observe_stage("atr_min", duration, pair)
+    logging.info(f"[{pair}] ATR Min updated to {atr_min:.4f} ({duration:.2f}s)")
+
+def _init_worker(level):
+    # The bot's log files and queue listener belong to the parent: the worker only logs to stderr
+    logging.basicConfig(level=level, format="%(asctime)s [%(levelname)s] atr-min worker: %(message)s", force=True)
+
+def start_atr_min_worker():
+    global _refresh_pool
+    # Spawned rather than forked: the bot process already runs threads holding locks
+    _refresh_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(logging.getLogger().getEffectiveLevel(),))
+
+def refresh_atr_min(pairs):
+    # Schedules a recalculation per pair and returns at once; values are published as they complete
+    futures = []
+    for pair in pairs:
+        previous = _refresh_futures.get(pair)
+        if previous and not previous.done():
+            logging.warning(f"[{pair}] Previous ATR Min calculation still running. Skipping refresh.")
+            continue
+        try:
+            future = _refresh_pool.submit(_timed_atr_min, pair)
+        except BrokenProcessPool:
+            logging.error("ATR Min worker died. Restarting it.")
+            start_atr_min_worker()
+            future = _refresh_pool.submit(_timed_atr_min, pair)
+        future.add_done_callback(lambda f, pair=pair: _publish_atr_min(pair, f))
+        _refresh_futures[pair] = future
+        futures.append(future)
+    return futures
+
+def stop_atr_min_worker():
+    if _refresh_pool:
+        _refresh_pool.shutdown(wait=False, cancel_futures=True)
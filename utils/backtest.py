@@ -0,0 +1,302 @@
+import sys
+import time
+import numpy as np
+from core.config import MODE, ATR_INTERVAL, TRADING_PARAMS, RECENTER_PARAMS
+from core.candle_store import CandleStore
+import strategies.dualk as dualk_mode
+import strategies.onek as onek_mode
+
+# Replays stored candles through the same position lifecycle as main.update_trailing_state:
+# a fill creates the opposite-side position (process_order), which is recentered and recalibrated
+# until activation, then trails until its stop is hit and the closing fill opens the next one.
+# Every candle close is one session price. Event detection is vectorized: for the current position
+# state, numpy masks find the next candle where recenter, ATR recalibration, activation, trail or stop
+# applies, and only that candle runs the scalar transition. Closing orders fill at their stop price.
+# Prices and distances come from the strategy modules themselves, given the backtest's params.
+
+FIRST_CHUNK = 32
+
+def get_args():
+    args = {'pair': None, 'atr_min': None, 'start_side': 'buy', 'show_trades': False}
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('PAIR='):
+            args['pair'] = arg.split('=')[1].upper()
+        elif arg.startswith('ATR_MIN='):
+            args['atr_min'] = float(arg.split('=')[1])
+        elif arg.startswith('START='):
+            args['start_side'] = arg.split('=')[1].lower()
+        elif arg == 'SHOW_TRADES':
+            args['show_trades'] = True
+
+    if not args['pair']:
+        print("Error: PAIR parameter is required.")
+        print("Usage: python -m utils.backtest PAIR=XBTEUR [ATR_MIN=0] [START=buy|sell] [SHOW_TRADES]")
+        sys.exit(1)
+
+    return args
+
+def side_params(mode, params):
+    # Same derived ATR_MIN as core.validation for dualk
+    resolved = {}
+    for side in ("sell", "buy"):
+        p = dict(params[side])
+        if mode == "dualk" and p.get("ATR_MIN") is None:
+            p["ATR_MIN"] = p["MIN_MARGIN"] / (p["K_ACT"] - p["K_STOP"])
+        resolved[side] = p
+    return resolved
+
+# Same dispatch as main.update_trailing_state, with the params passed in instead of TRADING_PARAMS[pair]
+def atr_value(mode, params, side, price, current_atr):
+    # dualk floors the ATR with ATR_MIN; onek uses the effective ATR as is
+    if mode == "dualk":
+        return dualk_mode.calculate_atr_value(side, price, current_atr, pair=None, params=params)
+    return current_atr
+
+def activation_dist(mode, params, side, atr_val, reference_price):
+    if mode == "onek":
+        return onek_mode.calculate_activation_dist(side, atr_val, reference_price, pair=None, params=params)
+    return dualk_mode.calculate_activation_dist(side, atr_val, pair=None, params=params)
+
+def stop_price(mode, params, side, reference_price, trailing_price, atr_val):
+    if mode == "onek":
+        return onek_mode.calculate_stop_price(side, trailing_price, atr_val, pair=None, params=params)
+    return dualk_mode.calculate_stop_price(side, reference_price, trailing_price, atr_val, pair=None, params=params)
+
+def process_order(mode, params, fill_side, fill_price, current_atr):
+    strategy = onek_mode if mode == "onek" else dualk_mode
+    return strategy.process_order(fill_side, fill_price, current_atr, pair=None, params=params)
+
+def _find_first(mask_fn, start, end):
+    # First index in [start, end) where mask_fn is True, scanning in doubling chunks
+    size = FIRST_CHUNK
+    lo = start
+    while lo < end:
+        hi = min(end, lo + size)
+        hits = np.flatnonzero(mask_fn(lo, hi))
+        if hits.size:
+            return lo + int(hits[0])
+        lo = hi
+        size *= 2
+    return end
+
+class _Replay:
+    def __init__(self, prices, effective_atr, mode, params, recenter):
+        self.prices = prices
+        self.effective_atr = effective_atr
+        self.mode = mode
+        self.params = params
+        self.atr_mult = float(recenter["ATR_MULT"])
+        self.price_pct = float(recenter["PRICE_PCT"])
+        self.n = len(prices)
+
+        # Per-side ATR used for the thresholds at each candle (dualk floors it with ATR_MIN)
+        self.atr_vals = {}
+        for side in ("sell", "buy"):
+            if mode == "dualk":
+                self.atr_vals[side] = np.fromiter(
+                    (atr_value(mode, params, side, price, atr) for price, atr in zip(prices.tolist(), effective_atr.tolist())),
+                    dtype=float, count=self.n)
+            else:
+                self.atr_vals[side] = effective_atr
+
+    def open_position(self, fill_side, fill_price, t):
+        side, atr_val, activation_price = process_order(self.mode, self.params, fill_side, fill_price,
+                                                        float(self.effective_atr[t]))
+        return {
+            "side": side,
+            "entry_price": fill_price,
+            "reference_price": fill_price,
+            "activation_atr": round(atr_val, 1),
+            "activation_price": round(activation_price, 1),
+            "trailing_price": None,
+            "created_index": t
+        }
+
+    def _calculate_activation_price(self, pos, atr_val):
+        side = pos["side"]
+        sign = 1 if side == "sell" else -1
+        activation_price = pos["reference_price"] + sign * activation_dist(self.mode, self.params, side, atr_val,
+                                                                           pos["reference_price"])
+        pos["activation_price"] = round(activation_price, 1)
+        pos["activation_atr"] = round(atr_val, 1)
+
+    def _calculate_stop_price(self, pos, atr_val, trailing_price):
+        side = pos["side"]
+        stop = stop_price(self.mode, self.params, side, pos["reference_price"], trailing_price, atr_val)
+        entry_price = pos["entry_price"]
+        pnl = (stop - entry_price) / entry_price * 100 if side == "sell" else (entry_price - stop) / entry_price * 100
+        pos["trailing_price"] = trailing_price
+        pos["stop_price"] = round(stop, 1)
+        pos["stop_atr"] = round(atr_val, 1)
+        pos["pnl"] = round(pnl, 2)
+
+    def run_inactive(self, pos, start):
+        # Returns the candle index where the position activates, or n if it never does
+        sell = pos["side"] == "sell"
+        atr_vals = self.atr_vals[pos["side"]]
+        prices = self.prices
+        t = start
+
+        while t < self.n:
+            activation_price = pos["activation_price"]
+            activation_atr = pos["activation_atr"]
+
+            def events(lo, hi):
+                price = prices[lo:hi]
+                atr_val = atr_vals[lo:hi]
+                threshold = np.maximum(self.atr_mult * atr_val, self.price_pct * price)
+                mask = (threshold > 0) & (np.abs(activation_price - price) > threshold)
+                mask |= (activation_atr * 0.8 > atr_val) | (atr_val > activation_atr * 1.2)
+                mask |= (price >= activation_price) if sell else (price <= activation_price)
+                return mask
+
+            t = _find_first(events, t, self.n)
+            if t >= self.n:
+                return self.n
+
+            price = float(prices[t])
+            atr_val = float(atr_vals[t])
+            threshold = max(self.atr_mult * atr_val, self.price_pct * price)
+            if threshold > 0 and abs(pos["activation_price"] - price) > threshold:
+                pos["reference_price"] = price
+                self._calculate_activation_price(pos, atr_val)
+            if pos["activation_atr"] * 0.8 > atr_val or atr_val > pos["activation_atr"] * 1.2:
+                self._calculate_activation_price(pos, atr_val)
+            if (sell and price >= pos["activation_price"]) or (not sell and price <= pos["activation_price"]):
+                self._calculate_stop_price(pos, atr_val, price)
+                pos["activation_index"] = t
+                return t
+            t += 1
+
+        return self.n
+
+    def run_active(self, pos, start):
+        # Returns the candle index where the stop is hit, or n if it is still trailing at the end
+        sell = pos["side"] == "sell"
+        atr_vals = self.atr_vals[pos["side"]]
+        prices = self.prices
+        t = start
+
+        while t < self.n:
+            trailing_price = pos["trailing_price"]
+            stop = pos["stop_price"]
+            stop_atr = pos["stop_atr"]
+
+            def events(lo, hi):
+                price = prices[lo:hi]
+                atr_val = atr_vals[lo:hi]
+                mask = (stop_atr * 0.8 > atr_val) | (atr_val > stop_atr * 1.2)
+                if sell:
+                    mask |= (price <= stop) | (price > trailing_price)
+                else:
+                    mask |= (price >= stop) | (price < trailing_price)
+                return mask
+
+            t = _find_first(events, t, self.n)
+            if t >= self.n:
+                return self.n
+
+            price = float(prices[t])
+            atr_val = float(atr_vals[t])
+            if pos["stop_atr"] * 0.8 > atr_val or atr_val > pos["stop_atr"] * 1.2:
+                self._calculate_stop_price(pos, atr_val, pos["trailing_price"])
+            if (sell and price <= pos["stop_price"]) or (not sell and price >= pos["stop_price"]):
+                return t
+            if (sell and price > pos["trailing_price"]) or (not sell and price < pos["trailing_price"]):
+                self._calculate_stop_price(pos, atr_val, price)
+            t += 1
+
+        return self.n
+
+def run_backtest(times, prices, atrs, mode=MODE, params=None, recenter=None, atr_min=0.0, start_side="buy"):
+    valid = ~np.isnan(atrs)
+    times = np.asarray(times[valid])
+    prices = np.asarray(prices[valid], dtype=float)
+    effective_atr = np.maximum(np.asarray(atrs[valid], dtype=float), atr_min)
+    replay = _Replay(prices, effective_atr, mode, side_params(mode, params), recenter)
+
+    fills = []
+    trades = []
+    open_position = None
+    n = replay.n
+
+    fill_side = start_side
+    fill_price = float(prices[0]) if n else None
+    t = 0
+    while t < n:
+        fills.append({"time": int(times[t]), "side": fill_side, "price": fill_price})
+        pos = replay.open_position(fill_side, fill_price, t)
+
+        # Activation and trailing never happen in the same session
+        activated = replay.run_inactive(pos, t)
+        closed = replay.run_active(pos, activated + 1) if activated < n else n
+        if closed >= n:
+            open_position = pos
+            break
+
+        trades.append({
+            "side": pos["side"],
+            "entry_price": pos["entry_price"],
+            "exit_price": pos["stop_price"],
+            "pnl": pos["pnl"],
+            "created_time": int(times[pos["created_index"]]),
+            "activation_time": int(times[activated]),
+            "closing_time": int(times[closed])
+        })
+
+        # The closing fill is picked up as a new order in the next session
+        fill_side = pos["side"]
+        fill_price = pos["stop_price"]
+        t = closed + 1
+
+    return build_report(times, fills, trades, open_position)
+
+def build_report(times, fills, trades, open_position):
+    pnls = np.array([trade["pnl"] for trade in trades], dtype=float)
+    in_position = sum(trade["closing_time"] - trade["activation_time"] for trade in trades)
+    waiting = sum(trade["activation_time"] - trade["created_time"] for trade in trades)
+    span = int(times[-1] - times[0]) if len(times) > 1 else 0
+
+    return {
+        "fills": fills,
+        "trades": trades,
+        "open_position": open_position,
+        "total_trades": len(trades),
+        "total_pnl": float(pnls.sum()) if len(pnls) else 0.0,
+        "avg_pnl": float(pnls.mean()) if len(pnls) else 0.0,
+        "win_rate": float((pnls > 0).mean()) if len(pnls) else 0.0,
+        "time_in_position": in_position,  # seconds trailing (activation -> close)
+        "time_waiting": waiting,  # seconds waiting for activation (creation -> activation)
+        "exposure": in_position / span if span else 0.0
+    }
+
+def backtest_pair(pair, atr_min=0.0, start_side="buy"):
+    candles = CandleStore(pair).read()
+    return run_backtest(candles["time"], candles["close"], candles["atr"], MODE,
+                        TRADING_PARAMS[pair], RECENTER_PARAMS[pair], atr_min, start_side)
+
+def print_report(pair, report, elapsed, show_trades=False):
+    print(f"--- Backtest {pair} ({MODE}, {ATR_INTERVAL}min candles) in {elapsed * 1000:.1f}ms ---")
+    print(f"Fills: {len(report['fills'])} | Closed trades: {report['total_trades']}")
+    print(f"Total PnL: {report['total_pnl']:+.2f}% | Average: {report['avg_pnl']:+.2f}% | Win rate: {report['win_rate']:.0%}")
+    print(f"Time in position: {report['time_in_position'] / 3600:.1f}h ({report['exposure']:.0%}) | "
+          f"Waiting for activation: {report['time_waiting'] / 3600:.1f}h")
+
+    if show_trades and report['trades']:
+        print(f"\n{'Closed':<20} | {'Side':<4} | {'Entry':>12} | {'Exit':>12} | {'PnL %':>7}")
+        print("-" * 68)
+        for trade in report['trades']:
+            closed = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(trade['closing_time']))
+            print(f"{closed:<20} | {trade['side']:<4} | {trade['entry_price']:>12,.1f} | "
+                  f"{trade['exit_price']:>12,.1f} | {trade['pnl']:>+7.2f}")
+
+if __name__ == "__main__":
+    args = get_args()
+    if args['atr_min'] is None:
+        from utils.atr_manager import calculate_atr_min
+        args['atr_min'] = calculate_atr_min(args['pair'])
+
+    started = time.perf_counter()
+    report = backtest_pair(args['pair'], args['atr_min'], args['start_side'])
+    print_report(args['pair'], report, time.perf_counter() - started, args['show_trades'])
@@ -1,12 +1,18 @@
 import pandas as pd
 import numpy as np
 import sys
-import os
+from collections import namedtuple
 from scipy.signal import argrelextrema
-from core.config import ATR_INTERVAL
+from core.candle_store import CandleStore, CANDLE_DTYPE, to_dataframe
 
 DEFAULT_ORDER = 20
 
+PIVOT_MIN = -1
+PIVOT_MAX = 1
+
+# Pivots as parallel arrays sorted by candle index, alternating between min and max
+Pivots = namedtuple('Pivots', ['index', 'type', 'price', 'dtime'])
+
 def get_args():
     args = {'pair': None, 'show_events': False, 'order': DEFAULT_ORDER}
 
@@ -26,89 +32,121 @@ def get_args():
     return args
 
 def load_data(pair):
-    atr_file = f"data/{pair}_atr_data_{ATR_INTERVAL}min.csv"
-    if not os.path.exists(atr_file):
-        raise FileNotFoundError(f"File not found: {atr_file}")
+    store = CandleStore(pair)
+    store.import_legacy_csv()
+    if not store.exists():
+        raise FileNotFoundError(f"File not found: {store.data_file}")
     
     try:
-        df = pd.read_csv(atr_file)
-        df.columns = [c.strip().lower() for c in df.columns]
+        candles = store.read()
     except Exception as e:
         raise Exception(f"Error reading file: {e}")
-    
-    required_cols = {'low', 'high', 'dtime', 'atr'}
-    if not required_cols.issubset(set(df.columns)):
-        raise ValueError(f"Missing required columns. Need: {required_cols}")
-    
-    df.dropna(inplace=True)
-    df.reset_index(drop=True, inplace=True)
-    return df
+
+    # Incomplete candles (no ATR yet) lead the store: slicing them off keeps the zero-copy view,
+    # anything else falls back to a filtered copy
+    valid = np.ones(len(candles), dtype=bool)
+    for name in CANDLE_DTYPE.names:
+        if candles.dtype[name].kind == 'f':
+            valid &= ~np.isnan(candles[name])
+    first = int(np.argmax(valid)) if valid.any() else len(candles)
+    candles = candles[first:] if valid[first:].all() else candles[valid]
+    return to_dataframe(candles)
+
+def find_extrema(df, order, start=0):
+    # Local extrema on candles from `start` on. Keeping `order` candles of left context makes them
+    # identical to a detection over the whole frame
+    offset = max(0, start - order)
+    if offset >= len(df):
+        return empty_pivots()
+    ilocs_min = argrelextrema(df['low'].values[offset:], np.less_equal, order=order)[0] + offset
+    ilocs_max = argrelextrema(df['high'].values[offset:], np.greater_equal, order=order)[0] + offset
+    ilocs_min, ilocs_max = ilocs_min[ilocs_min >= start], ilocs_max[ilocs_max >= start]
+
+    index = np.concatenate([ilocs_min, ilocs_max])
+    types = np.concatenate([np.full(len(ilocs_min), PIVOT_MIN, dtype=np.int8),
+                            np.full(len(ilocs_max), PIVOT_MAX, dtype=np.int8)])
+    prices = np.concatenate([df['low'].values[ilocs_min], df['high'].values[ilocs_max]])
+
+    # Stable sort: a min and a max on the same candle keep min first
+    order_idx = np.argsort(index, kind='stable')
+    index = index[order_idx]
+    return Pivots(index, types[order_idx], prices[order_idx], df['dtime'].values[index])
+
+def filter_pivots(pivots):
+    # Remove false pivots: of each run of consecutive same-type pivots keep the highest max
+    # (lowest min), the earliest one on ties
+    if len(pivots.index) == 0:
+        return pivots
+    # One linear pass: best key per run with reduceat, then the first pivot of each run matching it
+    types, prices = pivots.type, pivots.price
+    run_start = np.concatenate([[True], types[1:] != types[:-1]])
+    run = np.cumsum(run_start) - 1
+    key = np.where(types == PIVOT_MAX, prices, -prices)
+    best = np.maximum.reduceat(key, np.flatnonzero(run_start))
+    matches = np.flatnonzero(key == best[run])
+    first = np.concatenate([[True], run[matches][1:] != run[matches][:-1]])
+    return take_pivots(pivots, matches[first])
 
 def detect_pivots(df, order):
-    ilocs_min = argrelextrema(df['low'].values, np.less_equal, order=order)[0]
-    ilocs_max = argrelextrema(df['high'].values, np.greater_equal, order=order)[0]
-    
-    pivots = []
-    for i in ilocs_min:
-        pivots.append((i, 'min', df['low'].iloc[i], df.iloc[i]['dtime']))
-    for i in ilocs_max:
-        pivots.append((i, 'max', df['high'].iloc[i], df.iloc[i]['dtime']))
-    
-    pivots.sort(key=lambda x: x[0])
-
-    # Remove false pivots
-    i = 0    
-    while i < len(pivots) - 1:
-        _, curr_type, curr_price, _ = pivots[i]
-        _, next_type, next_price, _ = pivots[i + 1]
-        
-        if curr_type == next_type:
-            if (curr_type == 'max' and curr_price >= next_price) or \
-               (curr_type == 'min' and curr_price <= next_price):
-                del pivots[i + 1]
-            else:
-                del pivots[i]
-        else:
-            i += 1
+    return filter_pivots(find_extrema(df, order))
 
-    return pivots
-    
-def calculate_noise_between_pivots(df, pivot_pair):
-    start_idx, start_type, start_price, start_dtime = pivot_pair[0]
-    end_idx, end_type, end_price, end_dtime = pivot_pair[1]
-    
-    price_change = abs((end_price - start_price) / start_price)
-    segment = df.iloc[start_idx+1:end_idx]
-    
-    if len(segment) == 0:
-        return None
-    
-    if start_type == 'min' and end_type == 'max':
-        # Uptrend: calculate drawdown
-        rolling_max = segment['high'].expanding().max()
-        drawdowns = rolling_max - segment['low']
-        idx_max = drawdowns.idxmax()
-        max_value = drawdowns.loc[idx_max]
-    elif start_type == 'max' and end_type == 'min':
-        # Downtrend: calculate bounce
-        rolling_min = segment['low'].expanding().min()
-        bounces = segment['high'] - rolling_min
-        idx_max = bounces.idxmax()
-        max_value = bounces.loc[idx_max]
-    else:
-        return None
-    
-    atr_at_max = segment.loc[idx_max, 'atr']
-    k_value = max_value / atr_at_max if atr_at_max > 0 else 0
-    
-    return {
-        'type': 'uptrend' if start_type == 'min' else 'downtrend',
-        'start_dtime': start_dtime,
-        'end_dtime': end_dtime,
-        'price_change': price_change,
-        'k_value': k_value,
-        'atr_at_max': atr_at_max
-    }
+def empty_pivots():
+    return Pivots(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int8), np.empty(0), np.empty(0, dtype='datetime64[ns]'))
+
+def take_pivots(pivots, selector):
+    return Pivots(*(field[selector] for field in pivots))
+
+def concat_pivots(*parts):
+    return Pivots(*(np.concatenate(fields) for fields in zip(*parts)))
+
+def segmented_cummax(values, segment_ids):
+    # Running max restarted at each segment: rank the values, offset the ranks by segment so a
+    # global cumulative max never crosses a segment boundary, then map the ranks back to values
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = np.arange(len(values))
+    keys = segment_ids * len(values) + ranks
+    return values[order][np.maximum.accumulate(keys) - segment_ids * len(values)]
+
+def calculate_noise_events(df, pivots):
+    # Noise of every pivot-to-pivot segment (candles strictly between the two pivots) at once:
+    # uptrends (min -> max) measure the deepest drawdown from the running high,
+    # downtrends (max -> min) the highest bounce from the running low
+    starts, ends = pivots.index[:-1], pivots.index[1:]
+    lengths = np.maximum(ends - starts - 1, 0)
+    segments = np.flatnonzero(lengths)
+    if len(segments) == 0:
+        return []
+
+    lengths = lengths[segments]
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    segment_ids = np.repeat(np.arange(len(segments)), lengths)
+    rows = np.arange(lengths.sum()) - offsets[segment_ids] + starts[segments][segment_ids] + 1
+
+    high, low, atr = df['high'].values[rows], df['low'].values[rows], df['atr'].values[rows]
+    uptrend = pivots.type[segments] == PIVOT_MIN
+    drawdowns = segmented_cummax(high, segment_ids) - low
+    bounces = high + segmented_cummax(-low, segment_ids)
+    noise = np.where(uptrend[segment_ids], drawdowns, bounces)
+
+    # First candle reaching each segment's maximum, like idxmax
+    max_values = np.maximum.reduceat(noise, offsets)
+    at_max = np.flatnonzero(noise == max_values[segment_ids])
+    first = at_max[np.searchsorted(at_max, offsets)]
+    atr_at_max = atr[first]
+    k_values = np.divide(max_values, atr_at_max, out=np.zeros(len(segments)), where=atr_at_max > 0)
+
+    start_prices, end_prices = pivots.price[segments], pivots.price[segments + 1]
+    price_changes = np.abs((end_prices - start_prices) / start_prices)
+
+    return [{
+        'type': 'uptrend' if uptrend[i] else 'downtrend',
+        'start_dtime': pd.Timestamp(pivots.dtime[segment]),
+        'end_dtime': pd.Timestamp(pivots.dtime[segment + 1]),
+        'price_change': price_changes[i],
+        'k_value': k_values[i],
+        'atr_at_max': atr_at_max[i]
+    } for i, segment in enumerate(segments)]
 
 def analyze_structural_noise(pair, order=DEFAULT_ORDER, show_events=False):
     df = load_data(pair)
@@ -121,13 +159,11 @@ def analyze_structural_noise(pair, order=DEFAULT_ORDER, show_events=False):
     uptrend_data = []
     downtrend_data = []
     
-    for i in range(1, len(pivots)):
-        event = calculate_noise_between_pivots(df, (pivots[i-1], pivots[i]))
-        if event:
-            if event['type'] == 'uptrend':
-                uptrend_data.append(event)
-            else:
-                downtrend_data.append(event)
+    for event in calculate_noise_events(df, pivots):
+        if event['type'] == 'uptrend':
+            uptrend_data.append(event)
+        else:
+            downtrend_data.append(event)
     
     # Print results
     print_statistics(uptrend_data, "UPTREND NOISE (Stop Loss configuration)")
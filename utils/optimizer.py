@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from core.config import MODE, PAIRS, TRADING_PARAMS, RECENTER_PARAMS
+from core.candle_store import CandleStore
+from utils.backtest import run_backtest
+
+# Sweepable parameters: CLI name -> (params group, side, key)
+SWEEP_PARAMS = {
+    "SELL_K_ACT": ("trading", "sell", "K_ACT"),
+    "SELL_K_STOP": ("trading", "sell", "K_STOP"),
+    "SELL_MIN_MARGIN": ("trading", "sell", "MIN_MARGIN"),
+    "BUY_K_ACT": ("trading", "buy", "K_ACT"),
+    "BUY_K_STOP": ("trading", "buy", "K_STOP"),
+    "BUY_MIN_MARGIN": ("trading", "buy", "MIN_MARGIN"),
+    "RECENTER_ATR_MULT": ("recenter", None, "ATR_MULT"),
+    "RECENTER_PRICE_PCT": ("recenter", None, "PRICE_PCT")
+}
+OBJECTIVES = ["total_pnl", "avg_pnl", "win_rate", "total_trades", "exposure"]
+CHUNK_SIZE = 64
+
+def sweep_params(mode):
+    # onek has no activation multiplier: every K_ACT value would replay the same backtest
+    return {name: target for name, target in SWEEP_PARAMS.items() if mode == "dualk" or target[2] != "K_ACT"}
+
+def get_args():
+    args = {
+        'pairs': [pair for pair in PAIRS.keys() if pair],
+        'search': 'grid',
+        'samples': 1000,
+        'objectives': ['total_pnl'],
+        'top': 10,
+        'workers': os.cpu_count(),
+        'atr_min': None,
+        'seed': None,
+        'ranges': {}
+    }
+
+    for arg in sys.argv[1:]:
+        key, _, value = arg.partition('=')
+        key = key.upper()
+        if key == 'PAIRS':
+            args['pairs'] = [pair.strip().upper() for pair in value.split(',')]
+        elif key == 'SEARCH':
+            args['search'] = value.lower()
+        elif key == 'SAMPLES':
+            args['samples'] = int(value)
+        elif key == 'OBJECTIVE':
+            args['objectives'] = [objective.strip() for objective in value.split(',')]
+        elif key == 'TOP':
+            args['top'] = int(value)
+        elif key == 'WORKERS':
+            args['workers'] = int(value)
+        elif key == 'ATR_MIN':
+            args['atr_min'] = float(value)
+        elif key == 'SEED':
+            args['seed'] = int(value)
+        elif key in SWEEP_PARAMS:
+            args['ranges'][key] = parse_values(value)
+
+    unsupported = [name for name in args['ranges'] if name not in sweep_params(MODE)]
+    if unsupported:
+        print(f"Error: {', '.join(unsupported)} not used in {MODE} mode.")
+        sys.exit(1)
+
+    unknown = [o for o in args['objectives'] if o.lstrip('-') not in OBJECTIVES]
+    if not args['ranges'] or args['search'] not in ['grid', 'random'] or unknown:
+        print("Error: at least one parameter range and a valid SEARCH/OBJECTIVE are required.")
+        print("Usage: python -m utils.optimizer SELL_K_STOP=1:3:0.25 [BUY_K_STOP=1,1.5,2] [PAIRS=XBTEUR,ETHEUR]")
+        print("       [SEARCH=grid|random] [SAMPLES=1000] [OBJECTIVE=total_pnl,-exposure] [TOP=10] [WORKERS=8] [ATR_MIN=0] [SEED=1]")
+        print(f"Parameters: {', '.join(sweep_params(MODE))}")
+        print(f"Objectives: {', '.join(OBJECTIVES)} (prefix '-' to minimize)")
+        sys.exit(1)
+
+    return args
+
+def parse_values(value):
+    # "start:stop:step" (inclusive) or "a,b,c"
+    if ':' in value:
+        start, stop, step = (float(v) for v in value.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(count)]
+    return [float(v) for v in value.split(',')]
+
+def build_combinations(ranges, search, samples, seed):
+    names = list(ranges.keys())
+    shape = tuple(len(ranges[name]) for name in names)
+    total = int(np.prod(shape))
+    if search == 'grid' or samples >= total:
+        return [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+
+    # Random search draws distinct grid points without materializing the whole grid
+    rng = np.random.default_rng(seed)
+    picks = np.unravel_index(rng.choice(total, size=samples, replace=False), shape)
+    return [{name: ranges[name][pick[i]] for name, pick in zip(names, picks)} for i in range(samples)]
+
+def apply_combination(combination, trading, recenter, mode):
+    trading = {side: dict(values) for side, values in trading.items()}
+    recenter = dict(recenter)
+    for name, value in combination.items():
+        group, side, key = SWEEP_PARAMS[name]
+        if group == 'trading':
+            trading[side][key] = value
+            if mode == "dualk":
+                trading[side]["ATR_MIN"] = None  # Derived again from the swept values
+        else:
+            recenter[key] = value
+    return trading, recenter
+
+def is_valid(mode, trading):
+    if mode == "dualk":
+        return all(trading[side]["K_ACT"] > trading[side]["K_STOP"] for side in ("sell", "buy"))
+    return True
+
+# Worker side: candle arrays are attached from shared memory once per process, never pickled per task
+_worker_candles = {}
+_worker_segments = []
+
+def _attach_candles(segments):
+    for pair, (name, length) in segments.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_segments.append(shm)
+        _worker_candles[pair] = np.ndarray((3, length), dtype=np.float64, buffer=shm.buf)
+
+def _run_chunk(pair, mode, combinations, trading, recenter, atr_min):
+    times, closes, atrs = _worker_candles[pair]
+    results = []
+    for combination in combinations:
+        pair_trading, pair_recenter = apply_combination(combination, trading, recenter, mode)
+        report = run_backtest(times, closes, atrs, mode, pair_trading, pair_recenter, atr_min)
+        results.append((combination, {objective: report[objective] for objective in OBJECTIVES}))
+    return pair, results
+
+def share_candles(pairs):
+    segments = {}
+    shared = []
+    for pair in pairs:
+        candles = CandleStore(pair).read()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 3 * len(candles) * 8))
+        array = np.ndarray((3, len(candles)), dtype=np.float64, buffer=shm.buf)
+        array[0] = candles["time"]
+        array[1] = candles["close"]
+        array[2] = candles["atr"]
+        shared.append(shm)
+        segments[pair] = (shm.name, len(candles))
+    return segments, shared
+
+def rank(results, objectives):
+    def key(result):
+        metrics = result[1]
+        return tuple(metrics[o[1:]] if o.startswith('-') else -metrics[o] for o in objectives)
+    return sorted(results, key=key)
+
+def optimize(pairs, ranges, search='grid', samples=1000, objectives=('total_pnl',), workers=None,
+             atr_mins=None, seed=None, mode=MODE):
+    # atr_mins: {pair: effective ATR floor}, as computed by utils.atr_manager for the live bot
+    unsupported = [name for name in ranges if name not in sweep_params(mode)]
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)} not used in {mode} mode")
+    atr_mins = atr_mins or {}
+    combinations = build_combinations(ranges, search, samples, seed)
+    segments, shared = share_candles(pairs)
+    results = {pair: [] for pair in pairs}
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_candles, initargs=(segments,)) as pool:
+            futures = []
+            for pair in pairs:
+                valid = [c for c in combinations if is_valid(mode, apply_combination(c, TRADING_PARAMS[pair], RECENTER_PARAMS[pair], mode)[0])]
+                for i in range(0, len(valid), CHUNK_SIZE):
+                    futures.append(pool.submit(_run_chunk, pair, mode, valid[i:i + CHUNK_SIZE],
+                                               TRADING_PARAMS[pair], RECENTER_PARAMS[pair], atr_mins.get(pair, 0.0)))
+            for future in as_completed(futures):
+                pair, chunk_results = future.result()
+                results[pair].extend(chunk_results)
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+    return {pair: rank(pair_results, objectives) for pair, pair_results in results.items()}
+
+def print_results(pair, ranked, top):
+    print(f"\n=== {pair}: {len(ranked)} combinations ===")
+    for position, (combination, metrics) in enumerate(ranked[:top], start=1):
+        params = " ".join(f"{pair}_{name}={value:g}" for name, value in combination.items())
+        print(f"#{position:<3} PnL {metrics['total_pnl']:+8.2f}% | Avg {metrics['avg_pnl']:+6.2f}% | "
+              f"Win {metrics['win_rate']:4.0%} | Trades {metrics['total_trades']:4d} | "
+              f"Exposure {metrics['exposure']:4.0%} | {params}")
+
+if __name__ == "__main__":
+    args = get_args()
+    if args['atr_min'] is None:
+        from utils.atr_manager import calculate_atr_min
+        atr_mins = {pair: calculate_atr_min(pair) for pair in args['pairs']}
+    else:
+        atr_mins = {pair: args['atr_min'] for pair in args['pairs']}
+
+    started = time.perf_counter()
+    ranked = optimize(args['pairs'], args['ranges'], args['search'], args['samples'], args['objectives'],
+                      args['workers'], atr_mins, args['seed'])
+    for pair, pair_ranked in ranked.items():
+        print_results(pair, pair_ranked, args['top'])
+    print(f"\nSweep finished in {time.perf_counter() - started:.1f}s")